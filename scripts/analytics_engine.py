@@ -5,34 +5,45 @@ Government-grade travel pattern analysis and insights
 """
 
 import os
+import io
 import json
+import asyncio
+import gzip
 import numpy as np
 import pandas as pd
-import sqlite3
-import pymongo
+import time
+import importlib.util
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, List, Any, Tuple, Optional, Iterator, Iterable, Callable, Union
 from dataclasses import dataclass
 import secrets
 import hashlib
 
-# ML and Analytics imports
-try:
-    from sklearn.cluster import DBSCAN, KMeans
-    from sklearn.preprocessing import StandardScaler, LabelEncoder
-    from sklearn.ensemble import RandomForestClassifier, IsolationForest
-    from sklearn.metrics import silhouette_score, classification_report
-    from sklearn.model_selection import train_test_split
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    from geopy.distance import geodesic
-    import folium
-    ML_AVAILABLE = True
-except ImportError:
-    ML_AVAILABLE = False
-    print("Warning: ML libraries not available. Install with: pip install -r requirements.txt")
-
 from encryption_utils import TravealCrypto, TravealDataProcessor
+from trip_aggregates import TripAggregate, TripAggregateStore, ranked_counts
+from feature_store import FeatureMatrix, FeatureStore
+from cluster_index import ClusterIndex
+from trip_schema import normalize_trip_frame, concat_trip_frames, trip_zones, arrow_type
+from data_sources import (
+    TripDataSource, MongoTripSource, SQLiteTripSource, PostgresTripSource
+)
+
+
+def _installed(module: str) -> bool:
+    """Check for an optional dependency without importing it"""
+    return importlib.util.find_spec(module) is not None
+
+
+# Optional capabilities; the packages behind them are imported on first use
+CLUSTERING_AVAILABLE = _installed('sklearn')
+MODELS_AVAILABLE = CLUSTERING_AVAILABLE and _installed('joblib')
+MONGODB_AVAILABLE = _installed('pymongo')
+ZSTD_AVAILABLE = _installed('zstandard')
+
+# Every ML stage can run
+ML_AVAILABLE = CLUSTERING_AVAILABLE and MODELS_AVAILABLE
 
 
 @dataclass
@@ -52,144 +63,516 @@ class TripPattern:
 class TravealAnalytics:
     """Advanced analytics engine for travel data"""
     
+    # Columns never written to research exports
+    IDENTIFYING_COLUMNS = [
+        'user_id', 'device_id', 'ip_address', 'email', 'phone'
+    ]
+    
+    # Low-cardinality string columns stored dictionary-encoded in Parquet exports
+    CATEGORICAL_EXPORT_COLUMNS = [
+        'mode', 'purpose', 'weather', 'time_of_day', 'anonymization_level'
+    ]
+    
+    # Saved under model_dir next to the trained models
+    CLUSTER_INDEX_FILE = 'cluster_index.npz'
+    
+    # Source columns consumed by the anonymizer
+    TRIP_SOURCE_FIELDS = [
+        'user_id', 'distance', 'duration', 'mode', 'purpose',
+        'companions', 'weather', 'time_of_day',
+        'start_location', 'end_location', 'start_time'
+    ]
+    
     def __init__(self, 
                  db_connection=None, 
                  crypto_key: Optional[str] = None,
-                 enable_ml: bool = True):
-        """Initialize analytics engine"""
+                 enable_ml: bool = True,
+                 model_dir: Optional[str] = None,
+                 trip_store_dir: Optional[str] = None,
+                 trip_store_max_age_hours: float = 24,
+                 feature_cache_dir: Optional[str] = None):
+        """
+        Initialize analytics engine
+        
+        Args:
+            db_connection: A TripDataSource, or an open MongoClient or
+                DB-API (sqlite3, psycopg2, ...) connection to wrap in one
+        """
         self.db = db_connection
         self.crypto = TravealCrypto(crypto_key)
         self.data_processor = TravealDataProcessor(self.crypto)
-        self.enable_ml = enable_ml and ML_AVAILABLE
-        self.scaler = StandardScaler() if self.enable_ml else None
+        self.enable_ml = enable_ml and CLUSTERING_AVAILABLE
+        if enable_ml and not self.enable_ml:
+            print("Warning: ML libraries not available. Install with: pip install -r requirements.txt")
+        
+        # ML packages and model stores load on first use
+        self.model_dir = model_dir if self.enable_ml and MODELS_AVAILABLE else None
+        self._scaler = None
+        self._purpose_models = None
+        self._anomaly_models = None
+        self._cluster_index = None
+        
+        self.trip_store = None
+        if trip_store_dir:
+            from trip_store import TripParquetStore
+            self.trip_store = TripParquetStore(trip_store_dir, trip_store_max_age_hours)
+        self.feature_store = FeatureStore(feature_cache_dir) if feature_cache_dir else None
         self.location_clusters = {}
         self.trip_patterns = []
+    
+    @property
+    def db(self):
+        """The connection or data source trips are read from"""
+        return self._db
+    
+    @db.setter
+    def db(self, db_connection) -> None:
+        """Switch to another connection, wrapping it in a TripDataSource"""
+        self._db = db_connection
+        self.data_source = TripDataSource.wrap(db_connection) if db_connection else None
+    
+    @property
+    def scaler(self):
+        """StandardScaler for ML features, or None without ML"""
+        if self._scaler is None and self.enable_ml:
+            from sklearn.preprocessing import StandardScaler
+            self._scaler = StandardScaler()
+        return self._scaler
+    
+    @property
+    def purpose_models(self):
+        """TripPurposeModelStore under model_dir, or None without one"""
+        if self._purpose_models is None and self.model_dir:
+            from purpose_model import TripPurposeModelStore
+            self._purpose_models = TripPurposeModelStore(self.model_dir)
+        return self._purpose_models
+    
+    @property
+    def anomaly_models(self):
+        """AnomalyModelStore under model_dir, or None without one"""
+        if self._anomaly_models is None and self.model_dir:
+            from anomaly_model import AnomalyModelStore
+            self._anomaly_models = AnomalyModelStore(self.model_dir)
+        return self._anomaly_models
+    
+    @property
+    def cluster_index(self) -> Optional[ClusterIndex]:
+        """Index of the latest location clusters, loaded from model_dir if saved"""
+        if self._cluster_index is None and self.model_dir:
+            self._cluster_index = ClusterIndex.load(
+                os.path.join(self.model_dir, self.CLUSTER_INDEX_FILE)
+            )
+        return self._cluster_index
+        
+    def connect_to_database(self,
+                            db_type: str = "mongodb",
+                            connection_string: str = None,
+                            pool_size: int = 4):
+        """
+        Connect to a trip database through a pooled data source
+        
+        Args:
+            db_type: "mongodb", "sqlite" or "postgres"
+            connection_string: URI, file path or libpq DSN
+            pool_size: Connections shared by concurrent extractions
+        """
+        if db_type == "mongodb" and not MONGODB_AVAILABLE:
+            print("MongoDB connection failed: pymongo is not installed")
+            return
+        
+        factories = {
+            "mongodb": lambda: MongoTripSource(
+                connection_string or "mongodb://localhost:27017/", max_pool_size=pool_size
+            ),
+            "sqlite": lambda: SQLiteTripSource(connection_string or "traveal.db", pool_size=pool_size),
+            "postgres": lambda: PostgresTripSource(connection_string or "", pool_size=pool_size)
+        }
+        names = {"mongodb": "MongoDB", "sqlite": "SQLite", "postgres": "PostgreSQL"}
+        if db_type not in factories:
+            raise ValueError(f"Unsupported database type: {db_type}")
         
-    def connect_to_database(self, db_type: str = "mongodb", connection_string: str = None):
-        """Connect to database"""
-        if db_type == "mongodb":
-            try:
-                self.db = pymongo.MongoClient(connection_string or "mongodb://localhost:27017/")
-                print("✓ Connected to MongoDB")
-            except Exception as e:
-                print(f"MongoDB connection failed: {e}")
-        elif db_type == "sqlite":
-            try:
-                self.db = sqlite3.connect(connection_string or "traveal.db")
-                print("✓ Connected to SQLite")
-            except Exception as e:
-                print(f"SQLite connection failed: {e}")
+        try:
+            self.db = factories[db_type]()
+            print(f"✓ Connected to {names[db_type]}")
+        except Exception as e:
+            print(f"{names[db_type]} connection failed: {e}")
     
     def extract_trip_data(self, 
                          anonymize: bool = True,
-                         date_range: Tuple[datetime, datetime] = None) -> pd.DataFrame:
-        """Extract and preprocess trip data"""
-        if not self.db:
-            raise ValueError("No database connection available")
+                         date_range: Tuple[datetime, datetime] = None,
+                         workers: int = 1,
+                         columns: Optional[List[str]] = None,
+                         refresh: bool = False,
+                         normalize: bool = False) -> pd.DataFrame:
+        """
+        Extract and preprocess trip data
         
-        # MongoDB extraction
-        if hasattr(self.db, 'list_database_names'):  # MongoDB
-            traveal_db = self.db.traveal
-            trips_collection = traveal_db.trips
-            
-            query = {}
-            if date_range:
-                query['createdAt'] = {
-                    '$gte': date_range[0],
-                    '$lte': date_range[1]
-                }
-            
-            trips = list(trips_collection.find(query))
-            
-            # Convert to DataFrame
-            if not trips:
-                return pd.DataFrame()
-            
-            df = pd.DataFrame(trips)
-            
-        else:  # SQLite
-            query = """
-            SELECT * FROM trips 
-            WHERE createdAt >= ? AND createdAt <= ?
-            """ if date_range else "SELECT * FROM trips"
-            
-            params = (date_range[0], date_range[1]) if date_range else ()
-            df = pd.read_sql_query(query, self.db, params=params)
+        Anonymized extractions are served from the local trip store when it
+        holds a fresh copy of the requested window, and written back to it
+        otherwise.
         
-        if df.empty:
-            return df
-        
-        # Anonymize data if requested
-        if anonymize:
-            anonymized_data = []
-            for _, row in df.iterrows():
-                trip_data = row.to_dict()
-                anonymized = self.data_processor.anonymize_trip_data(trip_data)
-                anonymized_data.append(anonymized)
-            
-            df = pd.DataFrame(anonymized_data)
+        Args:
+            anonymize: Anonymize trips before returning them
+            date_range: Optional (start, end) filter; the store applies it
+                to trip start times
+            workers: Processes used to anonymize each chunk
+            columns: Columns to read from the trip store (all if not provided)
+            refresh: Re-extract from the database even if the store is fresh
+            normalize: Cast the result to the compact trip schema
+        """
+        use_store = self.trip_store is not None and anonymize
+        
+        if use_store and not refresh and self.trip_store.is_fresh(date_range):
+            df = self.trip_store.read(date_range, columns=columns)
+            return normalize_trip_frame(df) if normalize else df
+        
+        # The store keeps the plain anonymized form, so only normalize
+        # chunk by chunk when nothing is written back
+        chunks = list(self.extract_trip_chunks(
+            anonymize=anonymize,
+            date_range=date_range,
+            workers=workers,
+            normalize=normalize and not use_store
+        ))
+        
+        if not chunks:
+            return pd.DataFrame()
+        
+        df = concat_trip_frames(chunks)
+        
+        if use_store:
+            self.trip_store.append(df, date_range)
+            if columns is not None:
+                df = df[[column for column in columns if column in df.columns]]
+            if normalize:
+                df = normalize_trip_frame(df)
         
         return df
     
+    async def extract_trip_data_async(self,
+                                      anonymize: bool = True,
+                                      date_range: Tuple[datetime, datetime] = None,
+                                      workers: int = 1,
+                                      **kwargs) -> pd.DataFrame:
+        """
+        extract_trip_data for asyncio callers
+        
+        The extraction runs in a worker thread, so several report jobs can
+        await it concurrently while sharing the data source's connection
+        pool. Keyword arguments are passed through to extract_trip_data.
+        """
+        return await asyncio.to_thread(
+            self.extract_trip_data, anonymize, date_range, workers, **kwargs
+        )
+    
+    def extract_trip_chunks(self,
+                            anonymize: bool = True,
+                            date_range: Tuple[datetime, datetime] = None,
+                            chunk_size: int = 50000,
+                            fields: Optional[List[str]] = None,
+                            workers: int = 1,
+                            normalize: bool = False) -> Iterator[pd.DataFrame]:
+        """
+        Stream trip data as DataFrame chunks of at most chunk_size rows
+        
+        Args:
+            anonymize: Anonymize each chunk before yielding it
+            date_range: Optional (start, end) filter on createdAt
+            chunk_size: Maximum rows held in memory per chunk
+            fields: Columns to fetch (defaults to the anonymizer inputs
+                when anonymizing, all columns otherwise)
+            workers: Processes used to anonymize each chunk
+            normalize: Cast each chunk to the compact trip schema (join
+                chunks with concat_trip_frames to keep categoricals)
+            
+        Yields:
+            Non-empty trip DataFrames
+        """
+        if self.data_source is None:
+            raise ValueError("No database connection available")
+        
+        if fields is None and anonymize:
+            fields = self.TRIP_SOURCE_FIELDS
+        
+        with ExitStack() as stack:
+            # One worker pool for the whole stream rather than one per chunk
+            executor = None
+            if anonymize and workers > 1:
+                executor = stack.enter_context(self.data_processor.anonymize_pool(workers))
+            
+            for df in self.data_source.iter_trip_chunks(date_range, chunk_size, fields):
+                if df.empty:
+                    continue
+                
+                # Anonymize data if requested
+                if anonymize:
+                    df = self.data_processor.anonymize_trip_frame(
+                        df, workers=workers, executor=executor
+                    )
+                
+                if normalize:
+                    df = normalize_trip_frame(df)
+                
+                yield df
+    
     def analyze_location_clusters(self, 
                                 df: pd.DataFrame,
-                                cluster_radius: float = 0.1) -> Dict[str, Any]:
-        """Identify common locations using DBSCAN clustering"""
+                                cluster_radius: float = 0.1,
+                                grid_size: float = 0.001,
+                                silhouette_sample_size: Optional[int] = 10000,
+                                matrix: Optional[FeatureMatrix] = None) -> Dict[str, Any]:
+        """
+        Identify common locations using grid-indexed DBSCAN clustering
+        
+        Args:
+            df: Anonymized trip data with start_area/end_area zones
+            cluster_radius: DBSCAN eps in degrees
+            grid_size: Cell size in degrees used to bin points before
+                clustering (0.001 matches the anonymized zone resolution)
+            silhouette_sample_size: Points sampled for the silhouette
+                score; None scores every point
+            matrix: Cached features for `df`, whose zone coordinates are
+                used instead of flattening the zone dicts again
+        """
         if not self.enable_ml or df.empty:
             return {}
         
         # Extract location data
-        locations = []
-        for _, row in df.iterrows():
-            if 'start_area' in row and row['start_area']:
-                start = row['start_area']
-                locations.append([start['lat_zone'], start['lng_zone'], 'start'])
-            if 'end_area' in row and row['end_area']:
-                end = row['end_area']
-                locations.append([end['lat_zone'], end['lng_zone'], 'end'])
-        
-        if len(locations) < 10:
-            return {"error": "Insufficient location data for clustering"}
+        location_df = self._location_points(df, matrix)
         
-        location_df = pd.DataFrame(locations, columns=['lat', 'lng', 'type'])
+        if len(location_df) < 10:
+            return {"error": "Insufficient location data for clustering"}
         
         # DBSCAN clustering
         coords = location_df[['lat', 'lng']].values
-        dbscan = DBSCAN(eps=cluster_radius, min_samples=5)
-        clusters = dbscan.fit_predict(coords)
+        clusters = self._grid_dbscan(coords, cluster_radius, grid_size)
         
         location_df['cluster'] = clusters
         
-        # Analyze clusters
+        # Analyze clusters in a single grouped pass
+        clustered = location_df[location_df['cluster'] != -1]
+        grouped = clustered.groupby('cluster')
+        stats = grouped.agg(
+            lat_mean=('lat', 'mean'),
+            lng_mean=('lng', 'mean'),
+            lat_std=('lat', 'std'),
+            lng_std=('lng', 'std'),
+            point_count=('lat', 'size'),
+            start_trips=('is_start', 'sum')
+        )
+        
         cluster_analysis = {}
-        for cluster_id in set(clusters):
-            if cluster_id == -1:  # Noise points
-                continue
-            
-            cluster_points = location_df[location_df['cluster'] == cluster_id]
+        for cluster_id, row in zip(stats.index.tolist(), stats.itertuples(index=False)):
             cluster_analysis[f'cluster_{cluster_id}'] = {
                 'center': {
-                    'lat': cluster_points['lat'].mean(),
-                    'lng': cluster_points['lng'].mean()
+                    'lat': row.lat_mean,
+                    'lng': row.lng_mean
                 },
-                'point_count': len(cluster_points),
-                'start_trips': len(cluster_points[cluster_points['type'] == 'start']),
-                'end_trips': len(cluster_points[cluster_points['type'] == 'end']),
-                'radius': cluster_points[['lat', 'lng']].std().mean()
+                'point_count': int(row.point_count),
+                'start_trips': int(row.start_trips),
+                'end_trips': int(row.point_count - row.start_trips),
+                'radius': np.nanmean([row.lat_std, row.lng_std]) if row.point_count > 1 else np.nan
             }
         
         self.location_clusters = cluster_analysis
+        self._cluster_index = ClusterIndex.from_clusters(cluster_analysis)
+        if self.model_dir:
+            os.makedirs(self.model_dir, exist_ok=True)
+            self._cluster_index.save(os.path.join(self.model_dir, self.CLUSTER_INDEX_FILE))
         
         return {
             'total_clusters': len(cluster_analysis),
-            'clustered_points': len(location_df[location_df['cluster'] != -1]),
-            'noise_points': len(location_df[location_df['cluster'] == -1]),
+            'clustered_points': len(clustered),
+            'noise_points': len(location_df) - len(clustered),
             'clusters': cluster_analysis,
-            'silhouette_score': silhouette_score(coords, clusters) if len(set(clusters)) > 1 else 0
+            'silhouette_score': self._sampled_silhouette(coords, clusters, silhouette_sample_size)
         }
     
-    def analyze_trip_patterns(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze temporal and behavioral trip patterns"""
+    def _location_points(self,
+                         df: pd.DataFrame,
+                         matrix: Optional[FeatureMatrix] = None) -> pd.DataFrame:
+        """
+        Flatten start_area/end_area zones into one row per location point
+        
+        Returns a frame with float lat/lng columns and a boolean is_start,
+        start points first, then end points.
+        """
+        frames = []
+        for prefix, is_start in (('start', True), ('end', False)):
+            if matrix is not None:
+                lat, lng = matrix.column(f'{prefix}_lat'), matrix.column(f'{prefix}_lng')
+            else:
+                zones = trip_zones(df, prefix)
+                if zones is None:
+                    continue
+                lat, lng = zones
+            valid = ~(np.isnan(lat) | np.isnan(lng))
+            frames.append(pd.DataFrame({
+                'lat': lat[valid],
+                'lng': lng[valid],
+                'is_start': is_start
+            }))
+        
+        if not frames:
+            return pd.DataFrame({'lat': [], 'lng': [], 'is_start': []})
+        
+        return pd.concat(frames, ignore_index=True)
+    
+    def assign_trip_clusters(self,
+                             df: pd.DataFrame,
+                             matrix: Optional[FeatureMatrix] = None,
+                             max_distance: Optional[float] = None) -> pd.DataFrame:
+        """
+        Nearest location cluster of each trip's origin and destination
+        
+        Args:
+            df: Anonymized trip data with start_area/end_area zones
+            matrix: Cached features for `df`, used for the zone coordinates
+            max_distance: Meters beyond which a zone gets no cluster
+            
+        Returns:
+            DataFrame aligned with `df` with origin_cluster and
+            destination_cluster columns (-1 for no cluster)
+        """
+        index = self.cluster_index
+        if index is None:
+            raise ValueError("No cluster index; run analyze_location_clusters first")
+        
+        assigned = {}
+        for prefix, name in (('start', 'origin_cluster'), ('end', 'destination_cluster')):
+            if matrix is not None:
+                zones = matrix.column(f'{prefix}_lat'), matrix.column(f'{prefix}_lng')
+            else:
+                zones = trip_zones(df, prefix)
+            if zones is None:
+                assigned[name] = np.full(len(df), -1, dtype=np.int64)
+            else:
+                assigned[name] = index.nearest(zones[0], zones[1], max_distance)[0]
+        
+        return pd.DataFrame(assigned, index=df.index)
+    
+    def extract_trip_patterns(self,
+                              df: pd.DataFrame,
+                              matrix: Optional[FeatureMatrix] = None,
+                              max_distance: Optional[float] = None,
+                              min_frequency: int = 5) -> List[TripPattern]:
+        """
+        Group trips into origin/destination/mode/purpose patterns
+        
+        Args:
+            df: Anonymized trip data
+            matrix: Cached features for `df`
+            max_distance: Meters beyond which a zone gets no cluster
+            min_frequency: Trips a pattern needs to be reported
+            
+        Returns:
+            Patterns by descending frequency; also kept in self.trip_patterns
+        """
+        keys = ['origin_cluster', 'destination_cluster', 'mode', 'purpose']
+        trips = self.assign_trip_clusters(df, matrix, max_distance)
+        for name in ('mode', 'purpose'):
+            trips[name] = (df[name].astype(object).where(df[name].notna(), 'unknown')
+                           if name in df.columns else 'unknown')
+        for name in ('distance', 'duration'):
+            trips[name] = pd.to_numeric(df[name], errors='coerce') if name in df.columns else np.nan
+        time_features = self._time_features(df)
+        if time_features is not None:
+            trips['hour'], trips['day_of_week'] = time_features
+        
+        trips = trips[(trips['origin_cluster'] >= 0) & (trips['destination_cluster'] >= 0)]
+        grouped = trips.groupby(keys, sort=False)
+        summary = grouped.agg(
+            frequency=('origin_cluster', 'size'),
+            avg_distance=('distance', 'mean'),
+            avg_duration=('duration', 'mean')
+        )
+        summary = summary[summary['frequency'] >= min_frequency]
+        summary = summary.sort_values('frequency', ascending=False, kind='stable')
+        
+        top_values = {}
+        for name in ('hour', 'day_of_week'):
+            if name not in trips.columns:
+                continue
+            counts = trips.dropna(subset=[name]).groupby(keys + [name], sort=False).size()
+            counts = counts.sort_values(ascending=False, kind='stable')
+            top = counts.groupby(level=keys, sort=False).head(3)
+            top_values[name] = {}
+            for key, value in zip(top.index.droplevel(name), top.index.get_level_values(name)):
+                top_values[name].setdefault(key, []).append(int(value))
+        
+        patterns = []
+        for key, row in zip(summary.index, summary.itertuples(index=False)):
+            origin, destination, mode, purpose = key
+            patterns.append(TripPattern(
+                origin_cluster=int(origin),
+                destination_cluster=int(destination),
+                mode=mode,
+                purpose=purpose,
+                frequency=int(row.frequency),
+                avg_distance=float(row.avg_distance),
+                avg_duration=float(row.avg_duration),
+                time_patterns=top_values.get('hour', {}).get(key, []),
+                day_patterns=top_values.get('day_of_week', {}).get(key, [])
+            ))
+        
+        self.trip_patterns = patterns
+        return patterns
+    
+    def _grid_dbscan(self,
+                     coords: np.ndarray,
+                     eps: float,
+                     grid_size: float,
+                     min_samples: int = 5) -> np.ndarray:
+        """Run DBSCAN on weighted grid-cell centroids and map labels back to points"""
+        cells = np.floor(coords / grid_size).astype(np.int64)
+        _, inverse, counts = np.unique(
+            cells, axis=0, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        
+        centroids = np.column_stack([
+            np.bincount(inverse, weights=coords[:, 0]) / counts,
+            np.bincount(inverse, weights=coords[:, 1]) / counts
+        ])
+        
+        from sklearn.cluster import DBSCAN
+        
+        dbscan = DBSCAN(eps=eps, min_samples=min_samples)
+        cell_labels = dbscan.fit_predict(centroids, sample_weight=counts)
+        
+        return cell_labels[inverse]
+    
+    def _sampled_silhouette(self,
+                            coords: np.ndarray,
+                            clusters: np.ndarray,
+                            sample_size: Optional[int]) -> float:
+        """Silhouette score over a random sample of points"""
+        if len(set(clusters)) < 2:
+            return 0
+        
+        if sample_size is not None and sample_size >= len(coords):
+            sample_size = None
+        
+        from sklearn.metrics import silhouette_score
+        
+        try:
+            return silhouette_score(coords, clusters, sample_size=sample_size, random_state=42)
+        except ValueError:  # Sample drew a single cluster
+            return 0
+    
+    def analyze_trip_patterns(self,
+                              df: pd.DataFrame,
+                              aggregate: Optional[TripAggregate] = None) -> Dict[str, Any]:
+        """
+        Analyze temporal and behavioral trip patterns
+        
+        When `aggregate` is given (e.g. merged daily buckets from a
+        TripAggregateStore) the result is rendered from it instead of
+        scanning `df`.
+        """
+        if aggregate is not None:
+            return aggregate.to_pattern_analysis() if aggregate.trip_count else {}
+        
         if df.empty:
             return {}
         
@@ -202,86 +585,174 @@ class TravealAnalytics:
         }
         
         # Temporal patterns
-        if 'start_hour' in df.columns:
-            df['hour'] = pd.to_datetime(df['start_hour']).dt.hour
-            df['day_of_week'] = pd.to_datetime(df['start_hour']).dt.dayofweek
+        time_features = self._time_features(df)
+        if time_features is not None:
+            hour, day_of_week = time_features
+            hour_counts = hour.value_counts()
             
             analysis['temporal_patterns'] = {
-                'peak_hours': df['hour'].value_counts().head(5).to_dict(),
-                'day_distribution': df['day_of_week'].value_counts().to_dict(),
-                'hourly_average': df.groupby('hour').size().mean()
+                'peak_hours': dict(ranked_counts(hour_counts.to_dict())[:5]),
+                'day_distribution': dict(ranked_counts(day_of_week.value_counts().to_dict())),
+                'hourly_average': hour_counts.mean()
             }
         
         # Mode distribution
         if 'mode' in df.columns:
-            analysis['mode_distribution'] = df['mode'].value_counts().to_dict()
+            analysis['mode_distribution'] = self._value_counts(df['mode'])
         
         # Purpose distribution
         if 'purpose' in df.columns:
-            analysis['purpose_distribution'] = df['purpose'].value_counts().to_dict()
-        
-        # Distance statistics
-        if 'distance' in df.columns:
-            distance_stats = df['distance'].describe()
-            analysis['distance_statistics'] = {
-                'mean': distance_stats['mean'],
-                'median': distance_stats['50%'],
-                'std': distance_stats['std'],
-                'min': distance_stats['min'],
-                'max': distance_stats['max']
-            }
+            analysis['purpose_distribution'] = self._value_counts(df['purpose'])
         
-        # Duration statistics
-        if 'duration' in df.columns:
-            duration_stats = df['duration'].describe()
-            analysis['duration_statistics'] = {
-                'mean': duration_stats['mean'],
-                'median': duration_stats['50%'],
-                'std': duration_stats['std'],
-                'min': duration_stats['min'],
-                'max': duration_stats['max']
-            }
+        # Distance and duration statistics in one pass over both columns
+        numeric = [name for name in ('distance', 'duration') if name in df.columns]
+        if numeric:
+            statistics = self._summary_statistics(df, numeric)
+            for name in numeric:
+                analysis[f'{name}_statistics'] = statistics[name]
         
         return analysis
     
-    def detect_anomalies(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Detect unusual trip patterns using Isolation Forest"""
-        if not self.enable_ml or df.empty:
+    def analyze_trip_patterns_pushdown(self,
+                                       date_range: Optional[Tuple[datetime, datetime]] = None
+                                       ) -> Dict[str, Any]:
+        """
+        analyze_trip_patterns computed inside the database
+        
+        Counts and statistics are aggregated server-side over the raw
+        trips, so only a few hundred rows come back instead of the whole
+        window. Hours and weekdays are taken from the wall-clock start_time,
+        as the anonymized start_hour is.
+        
+        Args:
+            date_range: Optional (start, end) filter on createdAt
+        """
+        if self.data_source is None:
+            raise ValueError("Database connection not established")
+        
+        aggregates = self.data_source.pattern_aggregates(date_range)
+        if not aggregates['trip_count']:
             return {}
         
-        # Prepare features for anomaly detection
-        features = []
-        feature_names = []
+        aggregate = TripAggregate(trip_count=aggregates['trip_count'])
+        if aggregates['start_hours']:
+            prefixes = sorted(aggregates['start_hours'])
+            start_times = pd.DatetimeIndex(pd.to_datetime(prefixes, format='ISO8601'))
+            for hour, day, prefix in zip(start_times.hour.tolist(),
+                                         start_times.dayofweek.tolist(), prefixes):
+                count = aggregates['start_hours'][prefix]
+                aggregate.hour_counts[hour] = aggregate.hour_counts.get(hour, 0) + count
+                aggregate.day_counts[day] = aggregate.day_counts.get(day, 0) + count
+            aggregate.hour_counts = dict(sorted(aggregate.hour_counts.items()))
+            aggregate.day_counts = dict(sorted(aggregate.day_counts.items()))
+        aggregate.mode_counts = aggregates['value_counts'].get('mode') or {}
+        aggregate.purpose_counts = aggregates['value_counts'].get('purpose') or {}
+        
+        analysis = aggregate.to_pattern_analysis()
+        for name, statistics in aggregates['statistics'].items():
+            analysis[f'{name}_statistics'] = statistics or {}
+        return analysis
+    
+    def _value_counts(self, series: pd.Series) -> Dict[Any, int]:
+        """Ranked value counts, without the unused categories of categoricals"""
+        counts = series.value_counts()
+        return dict(ranked_counts(counts[counts > 0].to_dict()))
+    
+    def _time_features(self, df: pd.DataFrame) -> Optional[Tuple[pd.Series, pd.Series]]:
+        """
+        Hour and day-of-week series for each trip, without touching df
         
-        if 'distance' in df.columns:
-            features.append(df['distance'].fillna(df['distance'].median()))
-            feature_names.append('distance')
+        Normalized frames already carry both columns; otherwise each
+        distinct start_hour (trips share a few thousand hours at most) is
+        parsed once and the results are broadcast back to the trips.
+        """
+        if 'start_hour' not in df.columns:
+            return None
+        if 'hour' in df.columns and 'day_of_week' in df.columns:
+            return df['hour'], df['day_of_week']
         
-        if 'duration' in df.columns:
-            features.append(df['duration'].fillna(df['duration'].median()))
-            feature_names.append('duration')
+        codes, uniques = pd.factorize(df['start_hour'])
+        start_times = pd.DatetimeIndex(pd.to_datetime(uniques, format='ISO8601'))
+        hours, days = start_times.hour.to_numpy(), start_times.dayofweek.to_numpy()
+        if (codes < 0).any():  # Missing start times map to NaN
+            hours = np.append(hours, np.nan)
+            days = np.append(days, np.nan)
+        return (pd.Series(hours[codes], index=df.index, name='hour'),
+                pd.Series(days[codes], index=df.index, name='day_of_week'))
+    
+    def _summary_statistics(self,
+                            df: pd.DataFrame,
+                            columns: List[str]) -> Dict[str, Dict[str, float]]:
+        """mean/median/std/min/max per column, matching Series.describe()"""
+        values = np.asfortranarray(df[columns].to_numpy(dtype=float))
+        nan = float('nan')
         
-        if 'hour' in df.columns:
-            features.append(df['hour'].fillna(12))
-            feature_names.append('hour')
+        statistics = {}
+        for i, name in enumerate(columns):
+            column = values[:, i]
+            missing = np.isnan(column)
+            valid = column[~missing] if missing.any() else column
+            count = len(valid)
+            if count == 0:
+                statistics[name] = {key: nan for key in ('mean', 'median', 'std', 'min', 'max')}
+                continue
+            
+            # Sum with gaps zero-filled, as pandas does, so results match bit for bit
+            filled = np.where(missing, 0.0, column)
+            mean = filled.sum() / count
+            squares = (mean - filled) ** 2
+            squares[missing] = 0.0
+            
+            statistics[name] = {
+                'mean': mean,
+                'median': np.percentile(valid, 50),
+                'std': np.sqrt(squares.sum() / (count - 1)) if count > 1 else nan,
+                'min': valid.min(),
+                'max': valid.max()
+            }
         
-        if len(features) < 2:
-            return {"error": "Insufficient features for anomaly detection"}
+        return statistics
+    
+    def feature_matrix(self, df: pd.DataFrame) -> FeatureMatrix:
+        """
+        Numeric ML features for a trip DataFrame
         
-        feature_matrix = np.column_stack(features)
+        With a feature cache configured, the matrix is memory-mapped from
+        disk when this dataset has been seen before.
+        """
+        if self.feature_store is not None:
+            return self.feature_store.load_or_build(df)
+        return FeatureMatrix.from_frame(df)
+    
+    def detect_anomalies(self,
+                         df: pd.DataFrame,
+                         matrix: Optional[FeatureMatrix] = None) -> Dict[str, Any]:
+        """
+        Detect unusual trip patterns using Isolation Forest
         
-        # Isolation Forest
-        iso_forest = IsolationForest(
-            contamination=0.1,  # Expect 10% anomalies
-            random_state=42
-        )
+        With a model store configured, the stored detector is reused until
+        it goes stale; use score_trips to flag new trips as they arrive.
+        """
+        if not self.enable_ml or not MODELS_AVAILABLE or df.empty:
+            return {}
         
-        anomaly_labels = iso_forest.fit_predict(feature_matrix)
-        anomaly_scores = iso_forest.score_samples(feature_matrix)
+        if matrix is None:
+            matrix = self.feature_matrix(df)
+        
+        if self.anomaly_models is not None:
+            detector = self.anomaly_models.load_or_fit(df, matrix)
+        else:
+            from anomaly_model import fit_anomaly_detector
+            detector = fit_anomaly_detector(df, matrix=matrix)
+        
+        if detector is None:
+            return {"error": "Insufficient features for anomaly detection"}
+        
+        anomaly_scores = detector.score(matrix)
         
         # Add results to dataframe
         df_with_anomalies = df.copy()
-        df_with_anomalies['is_anomaly'] = anomaly_labels == -1
+        df_with_anomalies['is_anomaly'] = anomaly_scores < detector.model.offset_
         df_with_anomalies['anomaly_score'] = anomaly_scores
         
         anomalies = df_with_anomalies[df_with_anomalies['is_anomaly']]
@@ -297,77 +768,70 @@ class TravealAnalytics:
             }
         }
     
-    def predict_trip_purpose(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Predict trip purpose using machine learning"""
-        if not self.enable_ml or df.empty or 'purpose' not in df.columns:
-            return {}
-        
-        # Prepare features
-        features = []
-        feature_names = []
-        
-        if 'distance' in df.columns:
-            features.append('distance')
-        if 'duration' in df.columns:
-            features.append('duration')
-        if 'hour' in df.columns:
-            features.append('hour')
-        if 'day_of_week' in df.columns:
-            features.append('day_of_week')
-        if 'companions' in df.columns:
-            features.append('companions')
-        
-        if len(features) < 2:
-            return {"error": "Insufficient features for purpose prediction"}
-        
-        # Prepare data
-        df_clean = df[features + ['purpose']].dropna()
-        
-        if len(df_clean) < 50:
-            return {"error": "Insufficient data for training"}
+    def score_trips(self,
+                    trips: Union[pd.DataFrame, Dict[str, Any]]) -> Union[np.ndarray, float]:
+        """Score a trip batch or a single trip dict with the stored anomaly detector"""
+        if self.anomaly_models is None:
+            raise ValueError("Anomaly scoring requires a model_dir")
         
-        X = df_clean[features]
-        y = df_clean['purpose']
+        detector = self.anomaly_models.load()
+        if detector is None:
+            raise ValueError("No fitted anomaly detector available")
         
-        # Encode labels
-        label_encoder = LabelEncoder()
-        y_encoded = label_encoder.fit_transform(y)
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
-        )
+        return detector.score(trips)
+    
+    def predict_trip_purpose(self,
+                             df: pd.DataFrame,
+                             matrix: Optional[FeatureMatrix] = None) -> Dict[str, Any]:
+        """
+        Predict trip purpose using machine learning
         
-        # Train Random Forest
-        rf_model = RandomForestClassifier(
-            n_estimators=100,
-            random_state=42,
-            max_depth=10
-        )
+        With a model store configured, the stored model is reused and only
+        retrained when it is too old or the data has drifted, and a reused
+        model reports the hold-out metrics saved with it; otherwise a
+        fresh model is trained for this report.
+        """
+        if not self.enable_ml or not MODELS_AVAILABLE or df.empty or 'purpose' not in df.columns:
+            return {}
         
-        rf_model.fit(X_train, y_train)
+        if matrix is None:
+            matrix = self.feature_matrix(df)
         
-        # Predictions
-        y_pred = rf_model.predict(X_test)
+        if self.purpose_models is None:
+            from purpose_model import fit_purpose_model
+            result = fit_purpose_model(df, matrix=matrix)
+            result.pop('model', None)
+            return result
         
-        # Feature importance
-        feature_importance = dict(zip(features, rf_model.feature_importances_))
+        if self.purpose_models.needs_retrain(df, matrix):
+            return self.purpose_models.train(df, matrix)
         
-        return {
-            'model_accuracy': rf_model.score(X_test, y_test),
-            'feature_importance': feature_importance,
-            'classification_report': classification_report(
-                y_test, y_pred, 
-                target_names=label_encoder.classes_,
-                output_dict=True
-            ),
-            'prediction_confidence': rf_model.predict_proba(X_test).max(axis=1).mean()
-        }
+        # The stored model was trained on some of these rows; report its
+        # hold-out metrics instead of re-scoring them
+        purpose_model = self.purpose_models.load()
+        result = purpose_model.holdout_evaluation()
+        result['model_version'] = purpose_model.metadata['model_version']
+        return result
     
     def generate_insights_report(self, 
                                df: pd.DataFrame,
-                               save_path: Optional[str] = None) -> Dict[str, Any]:
-        """Generate comprehensive insights report"""
+                               save_path: Optional[str] = None,
+                               aggregate_store: Optional[TripAggregateStore] = None,
+                               window_days: int = 30,
+                               workers: int = 1) -> Dict[str, Any]:
+        """
+        Generate comprehensive insights report
+        
+        Args:
+            df: Trip data to analyze
+            save_path: Optional path to write the report JSON
+            aggregate_store: Enables incremental mode; `df` holds only the
+                new trips, which are bucketed into the store, and pattern
+                analysis runs over the merged rolling window
+            window_days: Size of the rolling window in incremental mode
+            workers: Threads used to run the independent analysis stages
+                concurrently; 1 runs them one after another
+        """
         
         print("🔍 Analyzing travel data...")
         
@@ -388,22 +852,58 @@ class TravealAnalytics:
         }
         
         if not df.empty:
-            # Location clustering
-            print("📍 Analyzing location clusters...")
-            report['location_analysis'] = self.analyze_location_clusters(df)
+            # Run every stage on compact columns
+            df = normalize_trip_frame(df)
             
-            # Pattern analysis
-            print("📊 Analyzing trip patterns...")
-            report['pattern_analysis'] = self.analyze_trip_patterns(df)
+            # Incremental mode: pattern analysis covers the rolling window
+            window = None
+            if aggregate_store is not None:
+                updated_days = aggregate_store.update_from_frame(df, merge_existing=True)
+                window_end = max(updated_days) if updated_days else datetime.utcnow().date()
+                window = aggregate_store.merge_window(window_end, window_days)
+                report['metadata']['window'] = {
+                    'end': window_end.isoformat(),
+                    'days': window_days,
+                    'total_trips': window.trip_count
+                }
             
-            # Anomaly detection
+            stage_timings = {}
+            matrix = None
             if self.enable_ml:
-                print("🚨 Detecting anomalies...")
-                report['anomaly_analysis'] = self.detect_anomalies(df)
-                
-                # Purpose prediction
-                print("🎯 Training purpose prediction model...")
-                report['prediction_analysis'] = self.predict_trip_purpose(df)
+                # Shared by the location and ML stages
+                matrix, stage_timings['feature_matrix'] = self._timed(
+                    lambda: self.feature_matrix(df)
+                )
+            
+            stages = [
+                ('location_analysis', "📍 Analyzing location clusters...",
+                 lambda: self.analyze_location_clusters(df, matrix=matrix)),
+                ('pattern_analysis', "📊 Analyzing trip patterns...",
+                 lambda: self.analyze_trip_patterns(df, aggregate=window))
+            ]
+            
+            if self.enable_ml and MODELS_AVAILABLE:
+                stages += [
+                    ('anomaly_analysis', "🚨 Detecting anomalies...",
+                     lambda: self.detect_anomalies(df, matrix)),
+                    ('prediction_analysis', "🎯 Training purpose prediction model...",
+                     lambda: self.predict_trip_purpose(df, matrix))
+                ]
+            
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = []
+                    for name, message, stage in stages:
+                        print(message)
+                        futures.append((name, executor.submit(self._timed, stage)))
+                    for name, future in futures:
+                        report[name], stage_timings[name] = future.result()
+            else:
+                for name, message, stage in stages:
+                    print(message)
+                    report[name], stage_timings[name] = self._timed(stage)
+            
+            report['metadata']['stage_timings'] = stage_timings
         
         # Generate recommendations
         report['recommendations'] = self._generate_recommendations(report)
@@ -416,6 +916,12 @@ class TravealAnalytics:
         
         return report
     
+    def _timed(self, stage: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], float]:
+        """Run a report stage and return its result with wall time in seconds"""
+        started = time.perf_counter()
+        result = stage()
+        return result, time.perf_counter() - started
+    
     def _generate_recommendations(self, report: Dict[str, Any]) -> List[str]:
         """Generate actionable recommendations based on analysis"""
         recommendations = []
@@ -462,18 +968,22 @@ class TravealAnalytics:
     def export_anonymized_data(self, 
                              df: pd.DataFrame,
                              format: str = 'csv',
-                             output_path: str = None) -> str:
-        """Export anonymized data for research purposes"""
+                             output_path: str = None,
+                             encrypt: bool = False) -> str:
+        """
+        Export anonymized data for research purposes
+        
+        With encrypt=True the file is written through a chunked AEAD stream
+        (TravealCrypto.open_encrypted) so no plaintext copy touches disk.
+        """
+        if format.lower() not in ('csv', 'json', 'parquet'):
+            raise ValueError(f"Unsupported format: {format}")
         
         # Ensure data is properly anonymized
         anonymized_df = df.copy()
         
         # Remove any potentially identifying columns
-        identifying_columns = [
-            'user_id', 'device_id', 'ip_address', 'email', 'phone'
-        ]
-        
-        for col in identifying_columns:
+        for col in self.IDENTIFYING_COLUMNS:
             if col in anonymized_df.columns:
                 del anonymized_df[col]
         
@@ -485,19 +995,212 @@ class TravealAnalytics:
         if not output_path:
             timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
             output_path = f"traveal_anonymized_data_{timestamp}.{format}"
+            if encrypt:
+                output_path += '.enc'
         
         # Export based on format
-        if format.lower() == 'csv':
-            anonymized_df.to_csv(output_path, index=False)
-        elif format.lower() == 'json':
-            anonymized_df.to_json(output_path, orient='records', indent=2)
-        elif format.lower() == 'parquet':
-            anonymized_df.to_parquet(output_path, index=False)
+        if encrypt:
+            with self.crypto.open_encrypted(output_path, 'wb') as stream:
+                self._write_export(anonymized_df, format.lower(), stream)
         else:
-            raise ValueError(f"Unsupported format: {format}")
+            self._write_export(anonymized_df, format.lower(), output_path)
         
         print(f"✓ Anonymized data exported to {output_path}")
         return output_path
+    
+    def export_trip_stream(self,
+                           chunks: Iterable[pd.DataFrame],
+                           format: str = 'parquet',
+                           output_path: str = None,
+                           compression: Optional[str] = None,
+                           encrypt: bool = False) -> str:
+        """
+        Export a stream of trip chunks incrementally with bounded memory
+        
+        Export metadata is written once per file instead of per row: in the
+        Parquet footer, or in a `<output_path>.meta.json` sidecar for
+        NDJSON and CSV.
+        
+        Args:
+            chunks: Trip DataFrames, e.g. from extract_trip_chunks; the
+                first chunk fixes the columns, later chunks may lack some
+                of them but a column it lacks raises ValueError
+            format: 'parquet' (one row group per chunk), 'ndjson' or 'csv'
+            output_path: Target file (generated if not provided)
+            compression: 'gzip' or 'zstd' (Parquet codec or whole-file stream)
+            encrypt: Write through TravealCrypto.open_encrypted
+        """
+        format = format.lower()
+        if format not in ('parquet', 'ndjson', 'csv'):
+            raise ValueError(f"Unsupported format: {format}")
+        if compression not in (None, 'gzip', 'zstd'):
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == 'zstd' and format != 'parquet' and not ZSTD_AVAILABLE:
+            raise ValueError("zstd compression requires the zstandard package")
+        
+        if not output_path:
+            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+            output_path = f"traveal_anonymized_data_{timestamp}.{format}"
+            if compression and format != 'parquet':
+                output_path += '.gz' if compression == 'gzip' else '.zst'
+            if encrypt:
+                output_path += '.enc'
+        
+        metadata = {
+            'export_date': datetime.utcnow().isoformat(),
+            'data_version': '1.0',
+            'format': format,
+            'compression': compression,
+            'encrypted': encrypt
+        }
+        
+        try:
+            with ExitStack() as stack:
+                if encrypt:
+                    sink = stack.enter_context(self.crypto.open_encrypted(output_path, 'wb'))
+                else:
+                    sink = stack.enter_context(open(output_path, 'wb'))
+                
+                if format == 'parquet':
+                    metadata['rows'] = self._write_parquet_stream(chunks, sink, metadata, compression)
+                else:
+                    if compression == 'gzip':
+                        sink = stack.enter_context(gzip.GzipFile(fileobj=sink, mode='wb'))
+                    elif compression == 'zstd':
+                        import zstandard
+                        sink = stack.enter_context(
+                            zstandard.ZstdCompressor().stream_writer(sink, closefd=False)
+                        )
+                    text = io.TextIOWrapper(sink, encoding='utf-8', newline='')
+                    stack.callback(text.detach)
+                    metadata['rows'], metadata['columns'] = self._write_text_stream(
+                        chunks, text, format
+                    )
+        except BaseException:
+            # Never leave a partial export behind
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        
+        if format != 'parquet':
+            with open(f"{output_path}.meta.json", 'w') as f:
+                json.dump(metadata, f, indent=2)
+        
+        print(f"✓ Anonymized data exported to {output_path} ({metadata['rows']} rows)")
+        return output_path
+    
+    def _export_chunk(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Drop identifying columns from one export chunk"""
+        return chunk.drop(
+            columns=[col for col in self.IDENTIFYING_COLUMNS if col in chunk.columns]
+        )
+    
+    def _check_new_columns(self, chunk_columns: Iterable[str], columns: List[str]) -> None:
+        """Reject columns first seen after the header or schema was written"""
+        known = set(columns)
+        new_columns = [col for col in chunk_columns if col not in known]
+        if new_columns:
+            raise ValueError(
+                f"Export chunk has columns missing from the first chunk: {new_columns}"
+            )
+    
+    def _write_text_stream(self,
+                           chunks: Iterable[pd.DataFrame],
+                           text: io.TextIOBase,
+                           format: str) -> Tuple[int, List[str]]:
+        """Append chunks as NDJSON lines or CSV rows; returns (rows, columns)"""
+        rows, columns = 0, None
+        for chunk in chunks:
+            chunk = self._export_chunk(chunk)
+            if chunk.empty:
+                continue
+            
+            if columns is None:
+                columns = list(chunk.columns)
+            else:
+                self._check_new_columns(chunk.columns, columns)
+            chunk = chunk.reindex(columns=columns)
+            
+            if format == 'csv':
+                chunk.to_csv(text, index=False, header=rows == 0)
+            else:
+                lines = chunk.to_json(orient='records', lines=True, date_format='iso')
+                text.write(lines if lines.endswith('\n') else lines + '\n')
+            rows += len(chunk)
+        
+        return rows, columns or []
+    
+    def _write_parquet_stream(self,
+                              chunks: Iterable[pd.DataFrame],
+                              sink,
+                              metadata: Dict[str, Any],
+                              compression: Optional[str]) -> int:
+        """Write each chunk as a Parquet row group; returns the row count"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer, schema, rows = None, None, 0
+        try:
+            for chunk in chunks:
+                chunk = self._export_chunk(chunk)
+                if chunk.empty:
+                    continue
+                
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    # Declared types rather than those inferred from this chunk,
+                    # e.g. an int64 distance that later chunks hold as floats
+                    fields = [
+                        field.with_type(arrow_type(field.name, field.type))
+                        for field in table.schema
+                    ]
+                    fields = [
+                        field.with_type(pa.dictionary(pa.int32(), pa.string()))
+                        if field.name in self.CATEGORICAL_EXPORT_COLUMNS
+                        and (pa.types.is_string(field.type) or pa.types.is_large_string(field.type))
+                        else field
+                        for field in fields
+                    ]
+                    schema = pa.schema(fields, metadata={
+                        **(table.schema.metadata or {}),
+                        b'traveal_export': json.dumps(metadata).encode()
+                    })
+                    writer = pq.ParquetWriter(sink, schema, compression=compression or 'snappy')
+                
+                self._check_new_columns(table.column_names, schema.names)
+                for field in schema:
+                    if field.name not in table.column_names:
+                        table = table.append_column(field.name, pa.nulls(len(table), field.type))
+                writer.write_table(table.select(schema.names).cast(schema))
+                rows += len(chunk)
+            
+            if writer is None:
+                # No rows: still produce a valid file carrying the metadata
+                schema = pa.schema([], metadata={b'traveal_export': json.dumps(metadata).encode()})
+                writer = pq.ParquetWriter(sink, schema)
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        return rows
+    
+    def _write_export(self, df: pd.DataFrame, format: str, target) -> None:
+        """Write an export to a path or binary stream"""
+        if format == 'parquet':
+            df.to_parquet(target, index=False)
+            return
+        
+        if not isinstance(target, str):
+            target = io.TextIOWrapper(target, encoding='utf-8', newline='')
+        
+        try:
+            if format == 'csv':
+                df.to_csv(target, index=False)
+            else:
+                df.to_json(target, orient='records', indent=2)
+        finally:
+            if isinstance(target, io.TextIOWrapper):
+                target.detach()
 
 
 def main():
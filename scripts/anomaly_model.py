@@ -0,0 +1,311 @@
+"""
+Trip Anomaly Detector for Traveal
+Fit once, persist, and score trips in batches or one at a time
+"""
+
+import os
+import json
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.ensemble import IsolationForest
+
+from feature_store import FeatureMatrix
+
+
+MODEL_FORMAT_VERSION = '1.0'
+
+# Candidate features, in the order they are fed to the model
+ANOMALY_FEATURES = ['distance', 'duration', 'hour']
+
+# Fixed fill values for missing features, used instead of the training median
+FEATURE_DEFAULTS = {'hour': 12}
+
+
+@dataclass
+class AnomalyDetector:
+    """A fitted IsolationForest with its feature list and fill values"""
+    model: IsolationForest
+    features: List[str]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._fill = np.array(
+            [self.metadata.get('feature_fill', {}).get(name, 0) for name in self.features],
+            dtype=float
+        )
+        self._path_tables = None
+
+    def feature_matrix(self, trips: Union[pd.DataFrame, FeatureMatrix]) -> np.ndarray:
+        """Build the model input from a trip DataFrame or a cached FeatureMatrix"""
+        if isinstance(trips, pd.DataFrame):
+            # Same derivation as training, e.g. hour from start_hour
+            trips = FeatureMatrix.from_frame(trips)
+
+        X = trips.select(self.features)
+        missing = np.isnan(X)
+        return np.where(missing, self._fill, X) if missing.any() else X
+
+    def _trip_vector(self, trip: Dict[str, Any]) -> np.ndarray:
+        """Build a single model input row from a trip dict"""
+        values = dict(trip)
+        if trip.get('start_hour') is not None:
+            # Matches FeatureMatrix.from_frame, which prefers start_hour
+            start_time = pd.Timestamp(trip['start_hour'])
+            if start_time is not pd.NaT:
+                values['hour'] = start_time.hour
+                values['day_of_week'] = start_time.dayofweek
+
+        row = self._fill.copy()
+        for i, name in enumerate(self.features):
+            value = values.get(name)
+            if value is not None and value == value:  # Skip None and NaN
+                row[i] = float(value)
+        return row.reshape(1, -1)
+
+    def _tree_path_tables(self) -> List[Tuple[Any, np.ndarray, np.ndarray]]:
+        """Per-tree (tree, feature subset, path length per node) lookup tables"""
+        if self._path_tables is None:
+            tables = []
+            for estimator, tree_features in zip(self.model.estimators_,
+                                                self.model.estimators_features_):
+                tree = estimator.tree_
+                depth = np.zeros(tree.node_count)
+                for node in range(tree.node_count):
+                    for child in (tree.children_left[node], tree.children_right[node]):
+                        if child != -1:
+                            depth[child] = depth[node] + 1
+                path_length = depth + _average_path_length(tree.n_node_samples)
+                tables.append((tree, np.asarray(tree_features), path_length))
+            self._path_tables = tables
+        return self._path_tables
+
+    def _score_single(self, row: np.ndarray) -> float:
+        """
+        Score one row by walking the trees directly
+
+        Matches IsolationForest.score_samples while skipping its per-call
+        validation overhead, which dominates for single trips.
+        """
+        row = row.astype(np.float32)
+        total = 0.0
+        for tree, tree_features, path_length in self._tree_path_tables():
+            total += path_length[tree.apply(row[:, tree_features])[0]]
+
+        normalizer = len(self.model.estimators_) * _average_path_length(
+            np.array([self.model.max_samples_])
+        )[0]
+        return -float(2 ** (-total / normalizer))
+
+    def score(self,
+              trips: Union[pd.DataFrame, FeatureMatrix, Dict[str, Any]]) -> Union[np.ndarray, float]:
+        """
+        Anomaly scores (lower is more anomalous, IsolationForest convention)
+
+        Args:
+            trips: A trip DataFrame or FeatureMatrix, or a single trip dict
+
+        Returns:
+            Array of scores for a DataFrame, a float for a single trip
+        """
+        if isinstance(trips, dict):
+            return self._score_single(self._trip_vector(trips))
+        return self.model.score_samples(self.feature_matrix(trips))
+
+    def is_anomaly(self,
+                   trips: Union[pd.DataFrame, Dict[str, Any]]) -> Union[np.ndarray, bool]:
+        """Flag trips whose score falls below the fitted contamination offset"""
+        scores = self.score(trips)
+        if isinstance(scores, float):
+            return bool(scores < self.model.offset_)
+        return scores < self.model.offset_
+
+
+class AnomalyModelStore:
+    """Versioned on-disk store of AnomalyDetector instances"""
+
+    def __init__(self,
+                 directory: str,
+                 max_age_days: float = 30,
+                 max_samples: Union[int, float, str] = 'auto',
+                 fit_sample_size: Optional[int] = 1000000,
+                 n_jobs: int = -1):
+        """
+        Args:
+            directory: Where model files are written
+            max_age_days: Refit once the latest model is older than this
+            max_samples: Rows drawn per tree (IsolationForest max_samples)
+            fit_sample_size: Rows sampled from large tables before fitting;
+                None fits on every row
+            n_jobs: Parallel jobs for fitting and scoring (-1 = all cores)
+        """
+        self.directory = directory
+        self.max_age_days = max_age_days
+        self.max_samples = max_samples
+        self.fit_sample_size = fit_sample_size
+        self.n_jobs = n_jobs
+        self._cached: Optional[AnomalyDetector] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, version: int) -> Dict[str, str]:
+        base = os.path.join(self.directory, f"anomaly_model_v{version}")
+        return {'model': f"{base}.joblib", 'metadata': f"{base}.json"}
+
+    def versions(self) -> List[int]:
+        """List stored detector versions in ascending order"""
+        versions = []
+        for name in os.listdir(self.directory):
+            if name.startswith('anomaly_model_v') and name.endswith('.json'):
+                versions.append(int(name[len('anomaly_model_v'):-len('.json')]))
+        return sorted(versions)
+
+    def fit(self,
+            df: pd.DataFrame,
+            matrix: Optional[FeatureMatrix] = None) -> Optional[AnomalyDetector]:
+        """Fit a new detector and persist it as the next version"""
+        detector = fit_anomaly_detector(
+            df,
+            max_samples=self.max_samples,
+            fit_sample_size=self.fit_sample_size,
+            n_jobs=self.n_jobs,
+            matrix=matrix
+        )
+        if detector is None:
+            return None
+
+        versions = self.versions()
+        version = versions[-1] + 1 if versions else 1
+        detector.metadata.update({
+            'format_version': MODEL_FORMAT_VERSION,
+            'model_version': version
+        })
+
+        paths = self._paths(version)
+        joblib.dump((detector.model, detector.features), paths['model'])
+        with open(paths['metadata'], 'w') as f:
+            json.dump(detector.metadata, f, indent=2)
+
+        self._cached = detector
+        return detector
+
+    def load(self, version: Optional[int] = None) -> Optional[AnomalyDetector]:
+        """Load a detector version (latest by default), or None if none exist"""
+        if version is None:
+            versions = self.versions()
+            if not versions:
+                return None
+            version = versions[-1]
+
+        if self._cached is not None and self._cached.metadata.get('model_version') == version:
+            return self._cached
+
+        paths = self._paths(version)
+        model, features = joblib.load(paths['model'])
+        with open(paths['metadata']) as f:
+            metadata = json.load(f)
+
+        model.set_params(n_jobs=self.n_jobs)
+        self._cached = AnomalyDetector(model, features, metadata)
+        return self._cached
+
+    def is_stale(self,
+                 detector: AnomalyDetector,
+                 df: pd.DataFrame,
+                 matrix: Optional[FeatureMatrix] = None) -> bool:
+        """Check detector age and whether new trips carry features it lacks"""
+        trained_at = datetime.fromisoformat(detector.metadata['trained_at'])
+        if (datetime.utcnow() - trained_at).total_seconds() > self.max_age_days * 86400:
+            return True
+        return len(_available_features(df, matrix)) > len(detector.features)
+
+    def load_or_fit(self,
+                    df: pd.DataFrame,
+                    matrix: Optional[FeatureMatrix] = None) -> Optional[AnomalyDetector]:
+        """Reuse the latest detector unless it is missing or stale"""
+        detector = self.load()
+        if detector is None or self.is_stale(detector, df, matrix):
+            detector = self.fit(df, matrix)
+        return detector
+
+
+def fit_anomaly_detector(df: pd.DataFrame,
+                         contamination: float = 0.1,
+                         max_samples: Union[int, float, str] = 'auto',
+                         fit_sample_size: Optional[int] = None,
+                         n_jobs: int = -1,
+                         matrix: Optional[FeatureMatrix] = None) -> Optional[AnomalyDetector]:
+    """
+    Fit an IsolationForest on trip features
+
+    Args:
+        matrix: Cached features for `df`; used instead of its columns
+
+    Returns:
+        The fitted detector, or None when fewer than two features exist
+    """
+    features = _available_features(df, matrix)
+    if len(features) < 2:
+        return None
+
+    fill = {}
+    for name in features:
+        if name in FEATURE_DEFAULTS:
+            fill[name] = FEATURE_DEFAULTS[name]
+        elif matrix is not None:
+            fill[name] = np.nanmedian(matrix.column(name))
+        else:
+            fill[name] = pd.to_numeric(df[name], errors='coerce').median()
+
+    rows = None
+    if fit_sample_size is not None and len(df) > fit_sample_size:
+        # Same rows df.sample would draw, as positions into the matrix
+        rows = pd.RangeIndex(len(df)).to_series().sample(
+            n=fit_sample_size, random_state=42
+        ).to_numpy()
+
+    metadata = {
+        'trained_at': datetime.utcnow().isoformat(),
+        'training_samples': len(df) if rows is None else len(rows),
+        'features': features,
+        'feature_fill': {name: float(value) for name, value in fill.items()}
+    }
+
+    detector = AnomalyDetector(
+        IsolationForest(
+            contamination=contamination,  # Expected share of anomalies
+            max_samples=max_samples,
+            random_state=42,
+            n_jobs=n_jobs
+        ),
+        features,
+        metadata
+    )
+    if matrix is not None:
+        X = detector.feature_matrix(matrix)
+        X = X if rows is None else X[rows]
+    else:
+        X = detector.feature_matrix(df if rows is None else df.iloc[rows])
+    detector.model.fit(X)
+    return detector
+
+
+def _available_features(df: pd.DataFrame,
+                        matrix: Optional[FeatureMatrix]) -> List[str]:
+    """Model features present in the cached matrix, or else in df's columns"""
+    if matrix is not None:
+        return [name for name in ANOMALY_FEATURES if name in matrix.available()]
+    return [name for name in ANOMALY_FEATURES if name in df.columns]
+
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Expected path length of an unsuccessful BST search over n samples"""
+    n_samples = np.asarray(n_samples, dtype=float)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    large = n_samples > 2
+    n = n_samples[large]
+    lengths[large] = 2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+    return lengths
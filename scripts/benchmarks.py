@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmarks for Traveal Python Components
+Run with: python benchmarks.py <benchmark> [options]
+"""
+
+import argparse
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from encryption_utils import TravealCrypto
+from analytics_engine import TravealAnalytics
+from trajectory import TripTrajectories
+
+
+def _rate(operation: Callable[[], object], budget: float) -> float:
+    """Operations per second, running for roughly `budget` seconds"""
+    count = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while count == 0 or elapsed < budget:
+        operation()
+        count += 1
+        elapsed = time.perf_counter() - started
+    return count / elapsed
+
+
+def benchmark_crypto_formats(sizes: List[int], budget: float) -> List[Dict[str, object]]:
+    """Messages per second for each payload version across payload sizes"""
+    crypto = TravealCrypto("benchmark-master-key")
+    formats = {
+        '1.0 (scrypt)': lambda data: crypto.encrypt_data_aes(data),
+        '1.0 (pbkdf2)': lambda data: crypto.encrypt_data_aes(data, use_scrypt=False),
+        '2.0 (aes-256-gcm)': lambda data: crypto.encrypt_data_aead(data),
+        '2.0 (chacha20-poly1305)': lambda data: crypto.encrypt_data_aead(
+            data, cipher='chacha20-poly1305'
+        )
+    }
+
+    # Warm the session key so v2.0 numbers reflect steady state
+    crypto.session_key_header()
+
+    results = []
+    for size in sizes:
+        data = secrets.token_hex(size // 2)
+        for name, encrypt in formats.items():
+            payload = encrypt(data)
+            results.append({
+                'format': name,
+                'size': size,
+                'encrypt_per_sec': _rate(lambda: encrypt(data), budget),
+                'decrypt_per_sec': _rate(lambda: crypto.decrypt_data_aes(payload), budget)
+            })
+    return results
+
+
+def synthetic_trips(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Anonymized-schema trips with ISO start_hour strings, as extracted"""
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range('2024-01-01', periods=24 * 90, freq='h')
+    iso_hours = np.array([ts.isoformat() for ts in hours], dtype=object)
+    return pd.DataFrame({
+        'distance': rng.lognormal(1.5, 0.8, rows),
+        'duration': rng.gamma(2.0, 15.0, rows),
+        'mode': rng.choice(['car', 'bus', 'walk', 'bike', 'metro'], rows),
+        'purpose': rng.choice(['work', 'school', 'shopping', 'leisure', 'other'], rows),
+        'start_hour': iso_hours[rng.integers(0, len(iso_hours), rows)]
+    })
+
+
+def legacy_trip_patterns(df: pd.DataFrame) -> Dict[str, Any]:
+    """The previous analyze_trip_patterns: two parses, in-place columns, two describes"""
+    analysis = {}
+    df['hour'] = pd.to_datetime(df['start_hour']).dt.hour
+    df['day_of_week'] = pd.to_datetime(df['start_hour']).dt.dayofweek
+    analysis['temporal_patterns'] = {
+        'peak_hours': df['hour'].value_counts().head(5).to_dict(),
+        'day_distribution': df['day_of_week'].value_counts().to_dict(),
+        'hourly_average': df.groupby('hour').size().mean()
+    }
+    analysis['mode_distribution'] = df['mode'].value_counts().to_dict()
+    analysis['purpose_distribution'] = df['purpose'].value_counts().to_dict()
+    for name in ('distance', 'duration'):
+        stats = df[name].describe()
+        analysis[f'{name}_statistics'] = {
+            'mean': stats['mean'],
+            'median': stats['50%'],
+            'std': stats['std'],
+            'min': stats['min'],
+            'max': stats['max']
+        }
+    return analysis
+
+
+def benchmark_trip_patterns(rows: int) -> Dict[str, Any]:
+    """Seconds per analyze_trip_patterns call, legacy vs single pass"""
+    df = synthetic_trips(rows)
+    analytics = TravealAnalytics(enable_ml=False)
+
+    started = time.perf_counter()
+    legacy = legacy_trip_patterns(df.copy(deep=False))
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    current = analytics.analyze_trip_patterns(df)
+    current_seconds = time.perf_counter() - started
+
+    return {
+        'rows': rows,
+        'legacy_seconds': legacy_seconds,
+        'single_pass_seconds': current_seconds,
+        'identical': legacy == current,
+        'input_unchanged': 'hour' not in df.columns
+    }
+
+
+def synthetic_trajectories(points: int, points_per_trip: int = 200,
+                           seed: int = 42) -> TripTrajectories:
+    """Random-walk GPS tracks sampled every 5 seconds around Kochi"""
+    rng = np.random.default_rng(seed)
+    trips = -(-points // points_per_trip)
+    offsets = np.minimum(np.arange(trips + 1) * points_per_trip, points)
+    return TripTrajectories(
+        trip_ids=np.arange(trips),
+        offsets=offsets.astype(np.int64),
+        lat=10.85 + np.cumsum(rng.normal(0, 5e-5, points)),
+        lng=76.27 + np.cumsum(rng.normal(0, 5e-5, points)),
+        times=np.arange(points, dtype=np.int64) * 5 * 10**9
+    )
+
+
+def benchmark_trajectories(points: int, geodesic_pairs: int) -> Dict[str, Any]:
+    """Vectorized trip metrics and simplification vs per-pair geopy distances"""
+    trajectories = synthetic_trajectories(points)
+
+    started = time.perf_counter()
+    metrics = trajectories.trip_metrics()
+    metrics_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    kept = int(trajectories.simplify_mask(10.0).sum())
+    simplify_seconds = time.perf_counter() - started
+
+    result = {
+        'points': points,
+        'trips': len(metrics),
+        'metrics_seconds': metrics_seconds,
+        'simplify_seconds': simplify_seconds,
+        'kept_points': kept,
+        'geodesic_points_per_sec': None
+    }
+
+    try:
+        from geopy.distance import geodesic
+    except ImportError:
+        return result
+
+    pairs = min(geodesic_pairs, points - 1)
+    lat, lng = trajectories.lat, trajectories.lng
+    started = time.perf_counter()
+    for i in range(pairs):
+        geodesic((lat[i], lng[i]), (lat[i + 1], lng[i + 1]))
+    result['geodesic_points_per_sec'] = pairs / (time.perf_counter() - started)
+    return result
+
+
+# Modules analytics_engine imported eagerly before they were loaded on demand
+EAGER_IMPORTS = [
+    'sklearn.cluster', 'sklearn.preprocessing', 'sklearn.ensemble', 'sklearn.metrics',
+    'sklearn.model_selection', 'matplotlib.pyplot', 'seaborn', 'geopy.distance',
+    'folium', 'pymongo'
+]
+
+_STARTUP_PROBE = '''
+import importlib, json, sys, time
+started = time.perf_counter()
+for module in {eager!r}:
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        pass
+from analytics_engine import TravealAnalytics
+TravealAnalytics(crypto_key="benchmark", enable_ml=False)
+heavy = sorted({{name.split('.')[0] for name in sys.modules}} & {heavy!r})
+print(json.dumps({{'seconds': time.perf_counter() - started, 'heavy_modules': heavy}}))
+'''
+
+
+def benchmark_startup(runs: int) -> List[Dict[str, Any]]:
+    """Median seconds to import analytics_engine and create a non-ML engine"""
+    heavy = {module.split('.')[0] for module in EAGER_IMPORTS}
+    scenarios = {'eager imports (previous)': EAGER_IMPORTS, 'on-demand imports': []}
+
+    results = []
+    for name, eager in scenarios.items():
+        code = _STARTUP_PROBE.format(eager=eager, heavy=heavy)
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, '-c', code],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                capture_output=True, text=True, check=True
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        results.append({
+            'scenario': name,
+            'seconds': statistics.median(sample['seconds'] for sample in samples),
+            'heavy_modules': samples[-1]['heavy_modules']
+        })
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Traveal performance benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    crypto_parser = subparsers.add_parser('crypto', help="Encrypted payload formats")
+    crypto_parser.add_argument('--sizes', type=int, nargs='+', default=[64, 1024, 16384, 262144])
+    crypto_parser.add_argument('--budget', type=float, default=1.0,
+                               help="Seconds spent per measurement")
+
+    patterns_parser = subparsers.add_parser('patterns', help="Trip pattern analysis")
+    patterns_parser.add_argument('--rows', type=int, default=10000000)
+
+    trajectory_parser = subparsers.add_parser('trajectory', help="GPS track processing")
+    trajectory_parser.add_argument('--points', type=int, default=10000000)
+    trajectory_parser.add_argument('--geodesic-pairs', type=int, default=20000,
+                                   help="Point pairs timed with geopy for comparison")
+
+    startup_parser = subparsers.add_parser('startup', help="Engine import and creation time")
+    startup_parser.add_argument('--runs', type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'crypto':
+        print(f"{'format':<26}{'bytes':>8}{'enc msg/s':>14}{'dec msg/s':>14}")
+        for row in benchmark_crypto_formats(args.sizes, args.budget):
+            print(f"{row['format']:<26}{row['size']:>8}"
+                  f"{row['encrypt_per_sec']:>14,.1f}{row['decrypt_per_sec']:>14,.1f}")
+    elif args.benchmark == 'patterns':
+        result = benchmark_trip_patterns(args.rows)
+        print(f"rows: {result['rows']:,}")
+        print(f"legacy:      {result['legacy_seconds']:.2f}s")
+        print(f"single pass: {result['single_pass_seconds']:.2f}s "
+              f"({result['legacy_seconds'] / result['single_pass_seconds']:.1f}x)")
+        print(f"identical output: {result['identical']}, "
+              f"input unchanged: {result['input_unchanged']}")
+    elif args.benchmark == 'trajectory':
+        result = benchmark_trajectories(args.points, args.geodesic_pairs)
+        rate = result['points'] / result['metrics_seconds']
+        print(f"points: {result['points']:,} in {result['trips']:,} trips")
+        print(f"trip metrics: {result['metrics_seconds']:.2f}s ({rate:,.0f} points/s)")
+        print(f"simplify:     {result['simplify_seconds']:.2f}s "
+              f"({result['kept_points']:,} points kept)")
+        if result['geodesic_points_per_sec'] is not None:
+            print(f"geopy geodesic: {result['geodesic_points_per_sec']:,.0f} points/s "
+                  f"({rate / result['geodesic_points_per_sec']:.0f}x slower)")
+    elif args.benchmark == 'startup':
+        for row in benchmark_startup(args.runs):
+            print(f"{row['scenario']:<26}{row['seconds']:>8.2f}s  "
+                  f"heavy modules: {', '.join(row['heavy_modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
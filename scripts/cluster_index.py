@@ -0,0 +1,127 @@
+"""
+Location Cluster Index for Traveal
+Haversine BallTree over cluster centers for nearest-hub and radius lookups
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from trajectory import EARTH_RADIUS_M
+
+
+class ClusterIndex:
+    """
+    Spatial index of location cluster centers
+
+    Built from the clusters of TravealAnalytics.analyze_location_clusters.
+    Only the centers are stored; the BallTree is rebuilt on first query,
+    which takes milliseconds for thousands of clusters.
+    """
+
+    def __init__(self, cluster_ids: np.ndarray, centers: np.ndarray, radii: np.ndarray):
+        """
+        Args:
+            cluster_ids: Integer id of each cluster
+            centers: (n, 2) lat/lng of cluster centers in degrees
+            radii: Cluster radius in degrees (NaN for single-point clusters)
+        """
+        self.cluster_ids = np.asarray(cluster_ids, dtype=np.int64)
+        self.centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        self.radii = np.asarray(radii, dtype=float)
+        self._tree = None
+
+    def __len__(self) -> int:
+        return len(self.cluster_ids)
+
+    @classmethod
+    def from_clusters(cls, clusters: Dict[str, Dict[str, Any]]) -> 'ClusterIndex':
+        """Index the 'cluster_<id>' entries of a cluster analysis"""
+        names = list(clusters)
+        return cls(
+            cluster_ids=[int(name.rsplit('_', 1)[-1]) for name in names],
+            centers=[[clusters[name]['center']['lat'], clusters[name]['center']['lng']]
+                     for name in names],
+            radii=[clusters[name].get('radius', np.nan) for name in names]
+        )
+
+    @property
+    def tree(self):
+        """sklearn BallTree on the centers, in radians"""
+        if self._tree is None:
+            from sklearn.neighbors import BallTree
+            self._tree = BallTree(np.radians(self.centers), metric='haversine')
+        return self._tree
+
+    def _query_points(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Radian query points and the mask of rows that have coordinates"""
+        lat = np.asarray(lat, dtype=float)
+        lng = np.asarray(lng, dtype=float)
+        valid = ~(np.isnan(lat) | np.isnan(lng))
+        return np.radians(np.column_stack([lat[valid], lng[valid]])), valid
+
+    def nearest(self,
+                lat: np.ndarray,
+                lng: np.ndarray,
+                max_distance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest cluster for each point
+
+        Args:
+            lat, lng: Point coordinates in degrees; NaN marks missing points
+            max_distance: Meters beyond which a point gets no cluster
+
+        Returns:
+            (cluster ids with -1 for no cluster, distances in meters with
+            NaN for no cluster)
+        """
+        clusters = np.full(len(lat), -1, dtype=np.int64)
+        distances = np.full(len(lat), np.nan)
+        points, valid = self._query_points(lat, lng)
+        if len(self) == 0 or len(points) == 0:
+            return clusters, distances
+
+        angles, positions = self.tree.query(points, k=1)
+        meters = angles[:, 0] * EARTH_RADIUS_M
+        found = np.ones(len(meters), dtype=bool)
+        if max_distance is not None:
+            found = meters <= max_distance
+
+        rows = np.flatnonzero(valid)[found]
+        clusters[rows] = self.cluster_ids[positions[found, 0]]
+        distances[rows] = meters[found]
+        return clusters, distances
+
+    def within(self, lat: np.ndarray, lng: np.ndarray, radius: float) -> List[np.ndarray]:
+        """
+        Clusters whose centers lie within `radius` meters of each point
+
+        Returns:
+            One array of cluster ids per point, nearest first (empty for
+            missing points)
+        """
+        results = [np.empty(0, dtype=np.int64) for _ in range(len(lat))]
+        points, valid = self._query_points(lat, lng)
+        if len(self) == 0 or len(points) == 0:
+            return results
+
+        positions = self.tree.query_radius(points, r=radius / EARTH_RADIUS_M,
+                                           sort_results=True, return_distance=True)[0]
+        for row, found in zip(np.flatnonzero(valid), positions):
+            results[row] = self.cluster_ids[found]
+        return results
+
+    def save(self, path: str) -> None:
+        """Write the index as an .npz file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, cluster_ids=self.cluster_ids, centers=self.centers, radii=self.radii)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ClusterIndex']:
+        """Read an index written by save, if present"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data['cluster_ids'], data['centers'], data['radii'])
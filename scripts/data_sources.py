@@ -0,0 +1,643 @@
+"""
+Trip Data Sources for Traveal
+Pooled MongoDB, SQLite and PostgreSQL readers behind one chunked interface
+"""
+
+import sys
+import queue
+import sqlite3
+import asyncio
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+DateRange = Optional[Tuple[datetime, datetime]]
+
+# Categorical fields counted by pattern pushdown
+PATTERN_COUNT_FIELDS = ['mode', 'purpose']
+
+# Numeric fields summarized by pattern pushdown
+PATTERN_STATISTIC_FIELDS = ['distance', 'duration']
+
+# Leading characters of an ISO timestamp up to the hour ('YYYY-MM-DDTHH')
+HOUR_PREFIX_LENGTH = 13
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool that opens connections lazily up to max_size
+
+    Callers borrow a connection with `with pool.connection() as conn:` and
+    block for up to `timeout` seconds when every connection is in use.
+    """
+
+    def __init__(self,
+                 factory: Optional[Callable[[], Any]],
+                 max_size: int = 4,
+                 timeout: float = 30.0,
+                 connections: Optional[List[Any]] = None):
+        """
+        Args:
+            factory: Opens a new connection; None for a fixed pool
+            max_size: Most connections open at once
+            timeout: Seconds to wait for a free connection
+            connections: Already open connections to seed the pool with
+        """
+        self._factory = factory
+        self.max_size = max_size if factory is not None else len(connections or [])
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        for connection in connections or []:
+            self._idle.put(connection)
+            self._created += 1
+
+    def _acquire(self) -> Any:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._factory is not None and self._created < self.max_size
+            if create:
+                self._created += 1
+
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No pooled connection available within {self.timeout}s")
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a connection for the duration of the block"""
+        connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self._lock:
+                self._created -= 1
+
+
+class TripDataSource(ABC):
+    """Base class for stores of raw trip documents"""
+
+    @abstractmethod
+    def iter_trip_chunks(self,
+                         date_range: DateRange = None,
+                         chunk_size: int = 50000,
+                         fields: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream trips as DataFrames of at most chunk_size rows
+
+        Args:
+            date_range: Optional (start, end) filter on createdAt
+            chunk_size: Maximum rows per chunk
+            fields: Columns to fetch (all if not provided); missing
+                columns are skipped
+        """
+
+    @abstractmethod
+    def pattern_aggregates(self, date_range: DateRange = None) -> Dict[str, Any]:
+        """
+        Aggregates behind analyze_trip_patterns, computed by the database
+
+        Returns:
+            {'trip_count': int,
+             'start_hours': {'YYYY-MM-DDTHH': count} or None,
+             'value_counts': {field: {value: count} or None},
+             'statistics': {field: {mean, median, std, min, max} or None}}
+            where None marks a field the trips do not have
+        """
+
+    def close(self) -> None:
+        """Release pooled connections"""
+
+    def __enter__(self) -> 'TripDataSource':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @classmethod
+    def wrap(cls, connection: Any) -> 'TripDataSource':
+        """
+        Data source for an already open connection
+
+        Accepts a TripDataSource, a sqlite3 connection, a psycopg2
+        connection, or a MongoClient (including mongomock's). Any other
+        DB-API connection is read with plain queries and pandas.
+        """
+        if isinstance(connection, TripDataSource):
+            return connection
+        if isinstance(connection, sqlite3.Connection):
+            return SQLiteTripSource(connection=connection)
+
+        module = type(connection).__module__.split('.')[0]
+        if module in ('pymongo', 'mongomock'):
+            return MongoTripSource(client=connection)
+        if module == 'psycopg2':
+            return PostgresTripSource(connection=connection)
+        if hasattr(connection, 'cursor'):
+            return DBAPITripSource(connection)
+
+        raise ValueError(f"Unsupported database connection: {type(connection).__name__}")
+
+
+class MongoTripSource(TripDataSource):
+    """Trips from a MongoDB collection; the client pools connections itself"""
+
+    def __init__(self,
+                 uri: str = "mongodb://localhost:27017/",
+                 database: str = 'traveal',
+                 collection: str = 'trips',
+                 max_pool_size: int = 10,
+                 min_pool_size: int = 0,
+                 client: Any = None):
+        """
+        Args:
+            uri: Connection string, used when no client is given
+            database: Database holding the trips collection
+            collection: Trips collection name
+            max_pool_size: Client connection pool limit (maxPoolSize)
+            min_pool_size: Connections kept open while idle (minPoolSize)
+            client: An existing MongoClient or mongomock.MongoClient
+        """
+        self._owns_client = client is None
+        if client is None:
+            import pymongo
+            client = pymongo.MongoClient(
+                uri, maxPoolSize=max_pool_size, minPoolSize=min_pool_size
+            )
+        self.client = client
+        self.collection = client[database][collection]
+
+    def iter_trip_chunks(self,
+                         date_range: DateRange = None,
+                         chunk_size: int = 50000,
+                         fields: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Read trips through a batched cursor"""
+        query = self._query(date_range)
+
+        projection = {field: 1 for field in fields} if fields else None
+        if projection is not None:
+            projection['_id'] = 0
+
+        cursor = self.collection.find(query, projection).batch_size(chunk_size)
+
+        batch = []
+        for trip in cursor:
+            batch.append(trip)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch)
+                batch = []
+
+        if batch:
+            yield pd.DataFrame(batch)
+
+    def _query(self, date_range: DateRange) -> Dict[str, Any]:
+        if not date_range:
+            return {}
+        return {'createdAt': {'$gte': date_range[0], '$lte': date_range[1]}}
+
+    def pattern_aggregates(self, date_range: DateRange = None) -> Dict[str, Any]:
+        """Run the pattern aggregates as one $facet pipeline plus small follow-ups"""
+        query = self._query(date_range)
+
+        # Dates render as ISO 8601 too, so ISO strings and dates share hour keys
+        hour_key = {'$substr': [{'$toString': '$start_time'}, 0, HOUR_PREFIX_LENGTH]}
+        facets = {
+            'trips': [{'$count': 'n'}],
+            'start_hours': [
+                {'$match': {'start_time': {'$ne': None}}},
+                {'$group': {'_id': hour_key, 'n': {'$sum': 1}}}
+            ]
+        }
+        for field in PATTERN_COUNT_FIELDS:
+            facets[field] = [
+                {'$match': {field: {'$ne': None}}},
+                {'$group': {'_id': f'${field}', 'n': {'$sum': 1}}}
+            ]
+        for field in PATTERN_STATISTIC_FIELDS:
+            facets[field] = [
+                {'$match': {field: {'$type': 'number'}}},
+                {'$group': {
+                    '_id': None,
+                    'count': {'$sum': 1},
+                    'total': {'$sum': f'${field}'},
+                    'min': {'$min': f'${field}'},
+                    'max': {'$max': f'${field}'}
+                }}
+            ]
+
+        result = next(iter(self.collection.aggregate(
+            [{'$match': query}, {'$facet': facets}], allowDiskUse=True
+        )))
+        trip_count = result['trips'][0]['n'] if result['trips'] else 0
+
+        statistics = {}
+        for field in PATTERN_STATISTIC_FIELDS:
+            if not result[field]:
+                statistics[field] = None
+                continue
+            moments = result[field][0]
+            numeric = dict(query, **{field: {'$type': 'number'}})
+            mean = moments['total'] / moments['count']
+            squares = next(iter(self.collection.aggregate([
+                {'$match': numeric},
+                {'$group': {'_id': None, 'total': {
+                    '$sum': {'$pow': [{'$subtract': [f'${field}', mean]}, 2]}
+                }}}
+            ], allowDiskUse=True)))['total']
+            # Sorted server-side; allowDiskUse lets collections too large for
+            # the in-memory sort limit spill to disk. An index on the field
+            # turns the sort into an index scan.
+            middle = [row[field] for row in self.collection.aggregate([
+                {'$match': numeric},
+                {'$sort': {field: 1}},
+                {'$skip': (moments['count'] - 1) // 2},
+                {'$limit': 2},
+                {'$project': {field: 1, '_id': 0}}
+            ], allowDiskUse=True)]
+            statistics[field] = _statistics(
+                moments['count'], mean, squares, moments['min'], moments['max'], middle
+            )
+
+        return {
+            'trip_count': trip_count,
+            'start_hours': {row['_id']: row['n'] for row in result['start_hours']} or None,
+            'value_counts': {
+                field: {row['_id']: row['n'] for row in result[field]} or None
+                for field in PATTERN_COUNT_FIELDS
+            },
+            'statistics': statistics
+        }
+
+    def close(self) -> None:
+        if self._owns_client:
+            self.client.close()
+
+
+class SQLTripSource(TripDataSource):
+    """Shared query building for SQL trip tables"""
+
+    # DB-API parameter marker
+    PLACEHOLDER = '?'
+
+    def __init__(self, pool: ConnectionPool, table: str = 'trips'):
+        self.pool = pool
+        self.table = table
+
+    def _table_columns(self, connection: Any) -> List[str]:
+        raise NotImplementedError
+
+    def _select(self,
+                connection: Any,
+                date_range: DateRange,
+                fields: Optional[List[str]]) -> Tuple[str, tuple]:
+        """SELECT statement and parameters for a trip extraction"""
+        columns = '*'
+        if fields:
+            available = set(self._table_columns(connection))
+            columns = ", ".join(f'"{field}"' for field in fields if field in available) or '*'
+
+        where, params = self._where(date_range)
+        return f'SELECT {columns} FROM {self.table} WHERE {where}', params
+
+    def _where(self, date_range: DateRange, *conditions: str) -> Tuple[str, tuple]:
+        """WHERE clause for the createdAt window plus extra conditions"""
+        clauses, params = list(conditions), ()
+        if date_range:
+            marker = self.PLACEHOLDER
+            clauses.append(f'"createdAt" >= {marker} AND "createdAt" <= {marker}')
+            params = (date_range[0], date_range[1])
+        return ' AND '.join(clauses) or '1 = 1', params
+
+    def _hour_prefix(self, column: str) -> str:
+        """SQL expression for the 'YYYY-MM-DDTHH' prefix of a timestamp column"""
+        return f'substr({column}, 1, {HOUR_PREFIX_LENGTH})'
+
+    def _end_read(self, connection: Any) -> None:
+        """Finish the read before the connection returns to the pool"""
+
+    def _fetch(self, connection: Any, query: str, params: tuple) -> List[tuple]:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def pattern_aggregates(self, date_range: DateRange = None) -> Dict[str, Any]:
+        """Run the pattern aggregates as GROUP BY queries"""
+        with self.pool.connection() as connection:
+            try:
+                return self._pattern_aggregates(connection, date_range)
+            finally:
+                self._end_read(connection)
+
+    def _pattern_aggregates(self, connection: Any, date_range: DateRange) -> Dict[str, Any]:
+        columns = set(self._table_columns(connection))
+
+        def fetch(select: str, *conditions: str, suffix: str = '', extra: tuple = ()):
+            where, params = self._where(date_range, *conditions)
+            return self._fetch(
+                connection,
+                f'SELECT {select} FROM {self.table} WHERE {where} {suffix}',
+                extra + params
+            )
+
+        trip_count = fetch('COUNT(*)')[0][0]
+
+        start_hours = None
+        if 'start_time' in columns:
+            prefix = self._hour_prefix('"start_time"')
+            start_hours = dict(fetch(
+                f'{prefix}, COUNT(*)', '"start_time" IS NOT NULL',
+                suffix=f'GROUP BY {prefix}'
+            ))
+
+        value_counts = {}
+        for field in PATTERN_COUNT_FIELDS:
+            value_counts[field] = dict(fetch(
+                f'"{field}", COUNT(*)', f'"{field}" IS NOT NULL',
+                suffix=f'GROUP BY "{field}"'
+            )) if field in columns else None
+
+        statistics = {}
+        for field in PATTERN_STATISTIC_FIELDS:
+            if field not in columns:
+                statistics[field] = None
+                continue
+            present = f'"{field}" IS NOT NULL'
+            count, total, minimum, maximum = fetch(
+                f'COUNT("{field}"), SUM("{field}"), MIN("{field}"), MAX("{field}")', present
+            )[0]
+            if not count:
+                statistics[field] = _statistics(0, 0.0, 0.0, None, None, [])
+                continue
+            mean = total / count
+            marker = self.PLACEHOLDER
+            squares = fetch(
+                f'SUM(("{field}" - {marker}) * ("{field}" - {marker}))', present,
+                extra=(mean, mean)
+            )[0][0]
+            middle = [row[0] for row in fetch(
+                f'"{field}"', present,
+                suffix=f'ORDER BY "{field}" LIMIT 2 OFFSET {(count - 1) // 2}'
+            )]
+            statistics[field] = _statistics(count, mean, squares, minimum, maximum, middle)
+
+        return {
+            'trip_count': trip_count,
+            'start_hours': start_hours or None,
+            'value_counts': value_counts,
+            'statistics': statistics
+        }
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class SQLiteTripSource(SQLTripSource):
+    """Trips from a SQLite database file"""
+
+    def __init__(self,
+                 path: str = 'traveal.db',
+                 pool_size: int = 4,
+                 timeout: float = 30.0,
+                 table: str = 'trips',
+                 connection: Optional[sqlite3.Connection] = None):
+        """
+        Args:
+            path: Database file; ':memory:' databases use a single connection
+            pool_size: Connections shared by concurrent extractions
+            timeout: Seconds to wait for a free connection
+            table: Trips table name
+            connection: An existing connection to use instead of opening one
+        """
+        if connection is not None:
+            pool = ConnectionPool(None, timeout=timeout, connections=[connection])
+        else:
+            pool = ConnectionPool(
+                lambda: sqlite3.connect(path, check_same_thread=False),
+                max_size=1 if path == ':memory:' else pool_size,
+                timeout=timeout
+            )
+        super().__init__(pool, table)
+
+    def _table_columns(self, connection: sqlite3.Connection) -> List[str]:
+        return [row[1] for row in connection.execute(f"PRAGMA table_info({self.table})")]
+
+    def iter_trip_chunks(self,
+                         date_range: DateRange = None,
+                         chunk_size: int = 50000,
+                         fields: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Read trips using pandas chunked queries"""
+        with self.pool.connection() as connection:
+            query, params = self._select(connection, date_range, fields)
+            yield from pd.read_sql_query(query, connection, params=params, chunksize=chunk_size)
+
+
+class DBAPITripSource(SQLTripSource):
+    """Trips from any other DB-API connection, read through pandas"""
+
+    PLACEHOLDERS = {'qmark': '?', 'format': '%s', 'pyformat': '%s'}
+
+    def __init__(self, connection: Any, table: str = 'trips', timeout: float = 30.0):
+        """
+        Args:
+            connection: An open DB-API connection whose driver uses qmark
+                or format parameters
+            table: Trips table name
+            timeout: Seconds to wait for the connection when it is busy
+        """
+        driver = sys.modules.get(type(connection).__module__.split('.')[0])
+        paramstyle = getattr(driver, 'paramstyle', 'qmark')
+        if paramstyle not in self.PLACEHOLDERS:
+            raise ValueError(f"Unsupported DB-API paramstyle: {paramstyle}")
+        self.PLACEHOLDER = self.PLACEHOLDERS[paramstyle]
+        super().__init__(ConnectionPool(None, timeout=timeout, connections=[connection]), table)
+
+    def _table_columns(self, connection: Any) -> List[str]:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {self.table} WHERE 1 = 0")
+            return [column[0] for column in cursor.description]
+        finally:
+            cursor.close()
+
+    def iter_trip_chunks(self,
+                         date_range: DateRange = None,
+                         chunk_size: int = 50000,
+                         fields: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Read trips using pandas chunked queries"""
+        with self.pool.connection() as connection:
+            query, params = self._select(connection, date_range, fields)
+            yield from pd.read_sql_query(query, connection, params=params, chunksize=chunk_size)
+
+
+class PostgresTripSource(SQLTripSource):
+    """Trips from PostgreSQL, streamed through server-side cursors"""
+
+    PLACEHOLDER = '%s'
+
+    def __init__(self,
+                 dsn: str = '',
+                 pool_size: int = 4,
+                 timeout: float = 30.0,
+                 table: str = 'trips',
+                 connection: Any = None):
+        """
+        Args:
+            dsn: libpq connection string
+            pool_size: Connections shared by concurrent extractions
+            timeout: Seconds to wait for a free connection
+            table: Trips table name
+            connection: An existing psycopg2 connection to use instead
+        """
+        if connection is not None:
+            pool = ConnectionPool(None, timeout=timeout, connections=[connection])
+        else:
+            import psycopg2
+            pool = ConnectionPool(lambda: psycopg2.connect(dsn),
+                                  max_size=pool_size, timeout=timeout)
+        super().__init__(pool, table)
+
+    def _hour_prefix(self, column: str) -> str:
+        # Text form of timestamp columns is 'YYYY-MM-DD HH:MI:SS'
+        return f'substr(CAST({column} AS text), 1, {HOUR_PREFIX_LENGTH})'
+
+    def _end_read(self, connection: Any) -> None:
+        connection.rollback()
+
+    def _table_columns(self, connection: Any) -> List[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = %s",
+                (self.table,)
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def iter_trip_chunks(self,
+                         date_range: DateRange = None,
+                         chunk_size: int = 50000,
+                         fields: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Read trips chunk by chunk so the result set never sits in memory"""
+        with self.pool.connection() as connection:
+            try:
+                query, params = self._select(connection, date_range, fields)
+                # Named cursors are server-side and fetch chunk_size rows at a time
+                with connection.cursor(name=f"traveal_trips_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = chunk_size
+                    cursor.execute(query, params)
+                    while True:
+                        rows = cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        columns = [column[0] for column in cursor.description]
+                        yield pd.DataFrame(rows, columns=columns)
+            finally:
+                # End the read transaction before the connection goes back
+                self._end_read(connection)
+
+
+def _statistics(count: int,
+                mean: float,
+                squares: float,
+                minimum: Optional[float],
+                maximum: Optional[float],
+                middle: List[float]) -> Dict[str, float]:
+    """
+    Render database moments in the analyze_trip_patterns statistics format
+
+    Args:
+        count: Non-null values
+        mean: Their mean
+        squares: Sum of squared deviations from the mean
+        minimum, maximum: Extremes
+        middle: The value at sorted position (count - 1) // 2 and the one after
+    """
+    nan = float('nan')
+    if count == 0:
+        return {'mean': nan, 'median': nan, 'std': nan, 'min': nan, 'max': nan}
+
+    lower = float(middle[0])
+    upper = float(middle[1]) if count % 2 == 0 else lower
+    return {
+        'mean': float(mean),
+        # Same interpolation as np.percentile(values, 50)
+        'median': upper - (upper - lower) * 0.5,
+        'std': float(np.sqrt(squares / (count - 1))) if count > 1 else nan,
+        'min': float(minimum),
+        'max': float(maximum)
+    }
+
+
+class AsyncTripSource:
+    """
+    asyncio front end for a TripDataSource
+
+    Blocking driver calls run in an executor (the default thread pool
+    unless one is given), so concurrent report jobs share the wrapped
+    source's connection pool without stalling the event loop.
+    """
+
+    def __init__(self, source: TripDataSource, executor: Optional[Executor] = None):
+        self.source = source
+        self.executor = executor
+
+    async def iter_trip_chunks(self,
+                               date_range: DateRange = None,
+                               chunk_size: int = 50000,
+                               fields: Optional[List[str]] = None) -> AsyncIterator[pd.DataFrame]:
+        """Async version of TripDataSource.iter_trip_chunks"""
+        loop = asyncio.get_running_loop()
+        chunks = self.source.iter_trip_chunks(date_range, chunk_size, fields)
+        done = object()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, chunks, done)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            await loop.run_in_executor(self.executor, chunks.close)
+
+    async def read(self,
+                   date_range: DateRange = None,
+                   fields: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read every matching trip into one DataFrame"""
+        chunks = [chunk async for chunk in self.iter_trip_chunks(date_range, fields=fields)]
+        if not chunks:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True)
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.source.close)
@@ -5,17 +5,216 @@ Government-grade encryption and data security for Python components
 """
 
 import os
+import io
 import json
 import base64
+import struct
 import hashlib
 import secrets
-from typing import Dict, Any, Optional, Tuple, Union
+import datetime
+import shutil
+import threading
+from collections import OrderedDict, deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Any, Optional, Tuple, Union, Callable, Hashable, Iterable, Iterator, List
+import numpy as np
+import pandas as pd
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
-from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes, padding, hmac
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 from cryptography.hazmat.backends import default_backend
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
+
+
+class DerivedKeyCache:
+    """Bounded LRU cache of derived key material, zeroized on eviction"""
+    
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, bytearray]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_or_derive(self, cache_key: Hashable, derive: Callable[[], bytes]) -> bytes:
+        """
+        Return cached key material, deriving and caching it on a miss
+        
+        Callers get an immutable copy: cached entries are zeroized in place
+        on eviction or clear(), which must not reach a key still in use.
+        """
+        with self._lock:
+            material = self._entries.get(cache_key)
+            if material is not None:
+                self._entries.move_to_end(cache_key)
+                return bytes(material)
+        
+        # Derive outside the lock so slow KDFs don't serialize other lookups
+        material = bytearray(derive())
+        
+        with self._lock:
+            existing = self._entries.get(cache_key)
+            if existing is not None:
+                self._zeroize(material)
+                self._entries.move_to_end(cache_key)
+                return bytes(existing)
+            
+            self._entries[cache_key] = material
+            key = bytes(material)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._zeroize(evicted)
+        
+        return key
+    
+    def clear(self) -> None:
+        """Zeroize and drop every cached key"""
+        with self._lock:
+            for material in self._entries.values():
+                self._zeroize(material)
+            self._entries.clear()
+    
+    @staticmethod
+    def _zeroize(material: bytearray) -> None:
+        material[:] = bytes(len(material))
+
+
+@dataclass
+class EncryptedRecord:
+    """
+    Compact binary framing of an encrypted payload
+    
+    Layout: 3-byte header (version, KDF id, cipher id), key field (salt
+    for v1.0, key id for v1.1/v2.0), IV or nonce, ciphertext, tag. The
+    sizes of every field but the ciphertext are fixed per version.
+    Fields are memoryview slices of the source buffer, so decoding
+    does not copy.
+    """
+    version: str
+    method: str
+    cipher: str
+    key: memoryview
+    iv: memoryview
+    ciphertext: memoryview
+    tag: memoryview
+    
+    HEADER = struct.Struct('>BBB')
+    VERSION_CODES = {'1.0': 0x10, '1.1': 0x11, '2.0': 0x20}
+    KDF_IDS = {'scrypt': 1, 'pbkdf2': 2}
+    CIPHER_IDS = {'aes-256-cbc': 0, 'aes-256-gcm': 1, 'chacha20-poly1305': 2}
+    # (key field, IV/nonce, tag) sizes per version
+    FIELD_SIZES = {'1.0': (32, 16, 32), '1.1': (8, 16, 32), '2.0': (8, 12, 16)}
+    
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> 'EncryptedRecord':
+        """Parse a binary record without copying its fields"""
+        view = memoryview(data)
+        version_code, kdf_id, cipher_id = cls.HEADER.unpack_from(view)
+        version = _reverse_lookup(cls.VERSION_CODES, version_code, 'version')
+        key_size, iv_size, tag_size = cls.FIELD_SIZES[version]
+        
+        offset = cls.HEADER.size
+        body_end = len(view) - tag_size
+        if body_end < offset + key_size + iv_size:
+            raise ValueError("Truncated encrypted record")
+        
+        return cls(
+            version=version,
+            method=_reverse_lookup(cls.KDF_IDS, kdf_id, 'KDF'),
+            cipher=_reverse_lookup(cls.CIPHER_IDS, cipher_id, 'cipher'),
+            key=view[offset:offset + key_size],
+            iv=view[offset + key_size:offset + key_size + iv_size],
+            ciphertext=view[offset + key_size + iv_size:body_end],
+            tag=view[body_end:]
+        )
+    
+    def to_bytes(self) -> bytes:
+        """Serialize to the binary layout"""
+        return b''.join((
+            self.HEADER.pack(
+                self.VERSION_CODES[self.version],
+                self.KDF_IDS[self.method],
+                self.CIPHER_IDS[self.cipher]
+            ),
+            self.key, self.iv, self.ciphertext, self.tag
+        ))
+    
+    @classmethod
+    def from_dict(cls, payload: Dict[str, str]) -> 'EncryptedRecord':
+        """Convert from the base64 dict format returned by TravealCrypto"""
+        version = payload.get('version', '1.0')
+        if version == '2.0':
+            sealed = base64.b64decode(payload['encrypted'])
+            tag_size = cls.FIELD_SIZES[version][2]
+            ciphertext, tag = sealed[:-tag_size], sealed[-tag_size:]
+            iv = base64.b64decode(payload['nonce'])
+        else:
+            ciphertext = base64.b64decode(payload['encrypted'])
+            tag = base64.b64decode(payload['auth_tag'])
+            iv = base64.b64decode(payload['iv'])
+        
+        if version == '1.0':
+            key = base64.b64decode(payload['salt'])
+        else:
+            key = bytes.fromhex(payload['key_id'])
+        
+        return cls(
+            version=version,
+            method=payload.get('method', 'pbkdf2'),
+            cipher=payload.get('cipher', 'aes-256-cbc'),
+            key=memoryview(key),
+            iv=memoryview(iv),
+            ciphertext=memoryview(ciphertext),
+            tag=memoryview(tag)
+        )
+    
+    def to_dict(self) -> Dict[str, str]:
+        """Convert to the base64 dict format accepted by decrypt_data_aes"""
+        b64 = lambda view: base64.b64encode(view).decode()
+        
+        if self.version == '2.0':
+            return {
+                'encrypted': b64(bytes(self.ciphertext) + bytes(self.tag)),
+                'nonce': b64(self.iv),
+                'key_id': self.key.hex(),
+                'method': self.method,
+                'cipher': self.cipher,
+                'version': self.version
+            }
+        
+        if self.version == '1.1':
+            return {
+                'encrypted': b64(self.ciphertext),
+                'iv': b64(self.iv),
+                'auth_tag': b64(self.tag),
+                'key_id': self.key.hex(),
+                'method': self.method,
+                'version': self.version
+            }
+        
+        return {
+            'encrypted': b64(self.ciphertext),
+            'salt': b64(self.key),
+            'iv': b64(self.iv),
+            'auth_tag': b64(self.tag),
+            'method': self.method,
+            'version': self.version
+        }
+
+
+def _reverse_lookup(codes: Dict[str, int], code: int, kind: str) -> str:
+    for name, value in codes.items():
+        if value == code:
+            return name
+    raise ValueError(f"Unknown {kind} id in encrypted record: {code}")
 
 
 class TravealCrypto:
@@ -30,11 +229,60 @@ class TravealCrypto:
     SCRYPT_N = 2**14
     SCRYPT_R = 8
     SCRYPT_P = 1
+    ENVELOPE_VERSION = '1.1'
+    AEAD_VERSION = '2.0'
+    AEAD_NONCE_SIZE = 12
+    AEAD_CIPHERS = {
+        'aes-256-gcm': AESGCM,
+        'chacha20-poly1305': ChaCha20Poly1305
+    }
     
-    def __init__(self, master_key: Optional[str] = None):
+    def __init__(
+        self, 
+        master_key: Optional[str] = None, 
+        key_cache_size: int = 64,
+        pseudonym_cache_size: int = 100000,
+        previous_master_keys: Optional[List[str]] = None
+    ):
         """Initialize with optional master key"""
         self.master_key = master_key or os.environ.get('TRAVEAL_ENCRYPTION_KEY')
+        self.previous_master_keys = list(previous_master_keys or [])
+        self._fernet: Optional[MultiFernet] = None
+        self.backend = default_backend()
+        self.key_cache = DerivedKeyCache(key_cache_size)
+        self._key_headers: Dict[str, Dict[str, str]] = {}
+        self._session_headers: Dict[bytes, Dict[str, str]] = {}
+        self._pseudonym_key: Optional[bytes] = None
+        self.pseudonym_cache_size = pseudonym_cache_size
+        self._init_pseudonym_memo()
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Drop the backend, derived keys and memo so instances can cross process pools
+        
+        The pseudonym key is derived first and kept, so workers do not
+        each rerun its PBKDF2 derivation.
+        """
+        self.pseudonym_key()
+        state = self.__dict__.copy()
+        state.pop('backend', None)
+        state.pop('_pseudonym_memo', None)
+        state['_fernet'] = None
+        state['key_cache'] = state['key_cache'].max_entries
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore instance state and recreate the backend, key cache and memo"""
+        self.__dict__.update(state)
         self.backend = default_backend()
+        self.key_cache = DerivedKeyCache(state['key_cache'])
+        self._init_pseudonym_memo()
+    
+    def _init_pseudonym_memo(self) -> None:
+        if self.pseudonym_cache_size:
+            self._pseudonym_memo = lru_cache(maxsize=self.pseudonym_cache_size)(self._pseudonymize)
+        else:
+            self._pseudonym_memo = self._pseudonymize
     
     def generate_key(self) -> bytes:
         """Generate a random 256-bit key"""
@@ -62,7 +310,6 @@ class TravealCrypto:
     def derive_key_scrypt(self, password: str, salt: bytes) -> bytes:
         """Derive key using Scrypt (more secure but slower)"""
         kdf = Scrypt(
-            algorithm=hashes.SHA256(),
             length=self.AES_KEY_SIZE,
             salt=salt,
             n=self.SCRYPT_N,
@@ -159,6 +406,12 @@ class TravealCrypto:
         Returns:
             Decrypted plaintext string
         """
+        version = encrypted_data.get('version')
+        if version == self.AEAD_VERSION:
+            return self._decrypt_aead(encrypted_data, password)
+        if version == self.ENVELOPE_VERSION:
+            return self._decrypt_envelope(encrypted_data, password)
+        
         try:
             # Extract components
             ciphertext = base64.b64decode(encrypted_data['encrypted'])
@@ -207,6 +460,563 @@ class TravealCrypto:
         except Exception as e:
             raise RuntimeError(f"Decryption failed: {str(e)}")
     
+    def create_key_header(
+        self,
+        password: Optional[str] = None,
+        use_scrypt: bool = True
+    ) -> Dict[str, str]:
+        """
+        Create and register a key header for envelope encryption
+        
+        The header holds the salt and KDF method once for many payloads.
+        It is not secret, but must be stored alongside the encrypted
+        records so they can be decrypted later.
+        """
+        header = {
+            'key_id': secrets.token_hex(8),
+            'salt': base64.b64encode(self.generate_salt()).decode(),
+            'method': 'scrypt' if use_scrypt else 'pbkdf2',
+            'version': self.ENVELOPE_VERSION
+        }
+        self.register_key_header(header)
+        return header
+    
+    def register_key_header(self, key_header: Dict[str, str]) -> None:
+        """Make a key header available for decrypting envelope payloads"""
+        self._key_headers[key_header['key_id']] = key_header
+    
+    def session_key_header(self, password: Optional[str] = None) -> Dict[str, str]:
+        """Key header shared by every envelope encryption in this session"""
+        key_password = self._require_password(password)
+        fingerprint = hashlib.sha256(key_password.encode()).digest()
+        if fingerprint not in self._session_headers:
+            self._session_headers[fingerprint] = self.create_key_header(key_password)
+        return self._session_headers[fingerprint]
+    
+    def clear_key_cache(self) -> None:
+        """Zeroize all cached derived keys"""
+        self.key_cache.clear()
+    
+    def _require_password(self, password: Optional[str]) -> str:
+        key_password = password or self.master_key
+        if not key_password:
+            raise ValueError("No password or master key provided")
+        return key_password
+    
+    def _envelope_keys(
+        self, 
+        key_header: Dict[str, str], 
+        password: Optional[str]
+    ) -> bytes:
+        """Derived 64-byte encryption + MAC key material for a key header"""
+        return self._header_key(key_header, password, self.ENVELOPE_VERSION, 2 * self.AES_KEY_SIZE)
+    
+    def _header_key(
+        self,
+        key_header: Dict[str, str],
+        password: Optional[str],
+        version: str,
+        length: int
+    ) -> bytes:
+        """Cached key material for a key header, bound to a payload version"""
+        key_password = self._require_password(password)
+        cache_key = (
+            key_header['key_id'],
+            version,
+            hashlib.sha256(key_password.encode()).digest()
+        )
+        
+        def derive() -> bytes:
+            salt = base64.b64decode(key_header['salt'])
+            if key_header['method'] == 'scrypt':
+                data_key = self.derive_key_scrypt(key_password, salt)
+            else:
+                data_key = self.derive_key_pbkdf2(key_password, salt)
+            return HKDF(
+                algorithm=hashes.SHA256(),
+                length=length,
+                salt=None,
+                info=b'traveal-envelope-' + version.encode(),
+                backend=self.backend
+            ).derive(data_key)
+        
+        return self.key_cache.get_or_derive(cache_key, derive)
+    
+    def encrypt_data_envelope(
+        self,
+        data: Union[str, dict],
+        password: Optional[str] = None,
+        key_header: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
+        """
+        Encrypt data with a cached per-session data key (AES-256-CBC + HMAC-SHA256)
+        
+        Args:
+            data: Data to encrypt (string or dictionary)
+            password: Optional password (uses master_key if not provided)
+            key_header: Header from create_key_header (defaults to the
+                session header for the password)
+            
+        Returns:
+            Dictionary containing encrypted data and the key_id of its header
+        """
+        try:
+            if isinstance(data, dict):
+                plaintext = json.dumps(data, separators=(',', ':'))
+            else:
+                plaintext = str(data)
+            
+            if key_header is None:
+                key_header = self.session_key_header(password)
+            else:
+                self.register_key_header(key_header)
+            
+            material = memoryview(self._envelope_keys(key_header, password))
+            iv = self.generate_iv()
+            
+            padder = padding.PKCS7(128).padder()
+            padded_data = padder.update(plaintext.encode()) + padder.finalize()
+            
+            encryptor = Cipher(
+                algorithms.AES(material[:self.AES_KEY_SIZE]),
+                modes.CBC(iv),
+                backend=self.backend
+            ).encryptor()
+            ciphertext = encryptor.update(padded_data) + encryptor.finalize()
+            
+            auth_tag = self._envelope_tag(material, key_header['key_id'], iv, ciphertext)
+            
+            return {
+                'encrypted': base64.b64encode(ciphertext).decode(),
+                'iv': base64.b64encode(iv).decode(),
+                'auth_tag': base64.b64encode(auth_tag).decode(),
+                'key_id': key_header['key_id'],
+                'method': key_header['method'],
+                'version': self.ENVELOPE_VERSION
+            }
+            
+        except Exception as e:
+            raise RuntimeError(f"Encryption failed: {str(e)}")
+    
+    def _decrypt_envelope(
+        self,
+        encrypted_data: Dict[str, str],
+        password: Optional[str] = None
+    ) -> str:
+        """Decrypt a payload produced by encrypt_data_envelope"""
+        try:
+            key_header = self._key_headers.get(encrypted_data['key_id'])
+            if key_header is None:
+                raise ValueError(f"Unknown key header: {encrypted_data['key_id']}")
+            
+            ciphertext = base64.b64decode(encrypted_data['encrypted'])
+            iv = base64.b64decode(encrypted_data['iv'])
+            auth_tag = base64.b64decode(encrypted_data['auth_tag'])
+            
+            material = memoryview(self._envelope_keys(key_header, password))
+            
+            expected_tag = self._envelope_tag(material, key_header['key_id'], iv, ciphertext)
+            if not secrets.compare_digest(auth_tag, expected_tag):
+                raise ValueError("Authentication tag verification failed")
+            
+            decryptor = Cipher(
+                algorithms.AES(material[:self.AES_KEY_SIZE]),
+                modes.CBC(iv),
+                backend=self.backend
+            ).decryptor()
+            padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+            
+            unpadder = padding.PKCS7(128).unpadder()
+            plaintext = unpadder.update(padded_plaintext) + unpadder.finalize()
+            
+            return plaintext.decode()
+            
+        except Exception as e:
+            raise RuntimeError(f"Decryption failed: {str(e)}")
+    
+    def _envelope_tag(
+        self,
+        material: memoryview,
+        key_id: str,
+        iv: bytes,
+        ciphertext: bytes
+    ) -> bytes:
+        """HMAC-SHA256 over key id, IV and ciphertext"""
+        mac = hmac.HMAC(material[self.AES_KEY_SIZE:], hashes.SHA256(), backend=self.backend)
+        mac.update(key_id.encode() + iv + ciphertext)
+        return mac.finalize()
+    
+    def encrypt_data_aead(
+        self,
+        data: Union[str, dict],
+        password: Optional[str] = None,
+        key_header: Optional[Dict[str, str]] = None,
+        cipher: str = 'aes-256-gcm'
+    ) -> Dict[str, str]:
+        """
+        Encrypt data in the version 2.0 AEAD format
+        
+        A single authenticated pass (AES-256-GCM or ChaCha20-Poly1305)
+        under the cached key-header key, with a random 96-bit nonce per
+        message. The key_id, cipher and version are bound as associated
+        data.
+        
+        Args:
+            data: Data to encrypt (string or dictionary)
+            password: Optional password (uses master_key if not provided)
+            key_header: Header from create_key_header (defaults to the
+                session header for the password)
+            cipher: 'aes-256-gcm' or 'chacha20-poly1305'
+            
+        Returns:
+            Dictionary containing the ciphertext (with tag), nonce and key_id
+        """
+        try:
+            if cipher not in self.AEAD_CIPHERS:
+                raise ValueError(f"Unsupported AEAD cipher: {cipher}")
+            
+            if isinstance(data, dict):
+                plaintext = json.dumps(data, separators=(',', ':'))
+            else:
+                plaintext = str(data)
+            
+            if key_header is None:
+                key_header = self.session_key_header(password)
+            else:
+                self.register_key_header(key_header)
+            
+            key = self._header_key(key_header, password, self.AEAD_VERSION, self.AES_KEY_SIZE)
+            nonce = secrets.token_bytes(self.AEAD_NONCE_SIZE)
+            associated_data = self._aead_associated_data(key_header['key_id'], cipher)
+            ciphertext = self.AEAD_CIPHERS[cipher](key).encrypt(
+                nonce, plaintext.encode(), associated_data
+            )
+            
+            return {
+                'encrypted': base64.b64encode(ciphertext).decode(),
+                'nonce': base64.b64encode(nonce).decode(),
+                'key_id': key_header['key_id'],
+                'method': key_header['method'],
+                'cipher': cipher,
+                'version': self.AEAD_VERSION
+            }
+            
+        except Exception as e:
+            raise RuntimeError(f"Encryption failed: {str(e)}")
+    
+    def _decrypt_aead(
+        self,
+        encrypted_data: Dict[str, str],
+        password: Optional[str] = None
+    ) -> str:
+        """Decrypt a payload produced by encrypt_data_aead"""
+        try:
+            key_header = self._key_headers.get(encrypted_data['key_id'])
+            if key_header is None:
+                raise ValueError(f"Unknown key header: {encrypted_data['key_id']}")
+            
+            cipher = encrypted_data['cipher']
+            if cipher not in self.AEAD_CIPHERS:
+                raise ValueError(f"Unsupported AEAD cipher: {cipher}")
+            
+            key = self._header_key(key_header, password, self.AEAD_VERSION, self.AES_KEY_SIZE)
+            plaintext = self.AEAD_CIPHERS[cipher](key).decrypt(
+                base64.b64decode(encrypted_data['nonce']),
+                base64.b64decode(encrypted_data['encrypted']),
+                self._aead_associated_data(key_header['key_id'], cipher)
+            )
+            
+            return plaintext.decode()
+            
+        except Exception as e:
+            raise RuntimeError(f"Decryption failed: {str(e) or type(e).__name__}")
+    
+    def _aead_associated_data(self, key_id: str, cipher: str) -> bytes:
+        return f"{self.AEAD_VERSION}|{cipher}|{key_id}".encode()
+    
+    def encrypt_record(
+        self,
+        data: Union[str, dict],
+        password: Optional[str] = None,
+        key_header: Optional[Dict[str, str]] = None,
+        cipher: str = 'aes-256-gcm'
+    ) -> bytes:
+        """Encrypt straight to the compact binary record format (v2.0 AEAD)"""
+        try:
+            if cipher not in self.AEAD_CIPHERS:
+                raise ValueError(f"Unsupported AEAD cipher: {cipher}")
+            
+            if isinstance(data, dict):
+                plaintext = json.dumps(data, separators=(',', ':'))
+            else:
+                plaintext = str(data)
+            
+            if key_header is None:
+                key_header = self.session_key_header(password)
+            else:
+                self.register_key_header(key_header)
+            
+            key = self._header_key(key_header, password, self.AEAD_VERSION, self.AES_KEY_SIZE)
+            nonce = secrets.token_bytes(self.AEAD_NONCE_SIZE)
+            sealed = self.AEAD_CIPHERS[cipher](key).encrypt(
+                nonce,
+                plaintext.encode(),
+                self._aead_associated_data(key_header['key_id'], cipher)
+            )
+            
+            return b''.join((
+                EncryptedRecord.HEADER.pack(
+                    EncryptedRecord.VERSION_CODES[self.AEAD_VERSION],
+                    EncryptedRecord.KDF_IDS[key_header['method']],
+                    EncryptedRecord.CIPHER_IDS[cipher]
+                ),
+                bytes.fromhex(key_header['key_id']),
+                nonce,
+                sealed
+            ))
+            
+        except Exception as e:
+            raise RuntimeError(f"Encryption failed: {str(e)}")
+    
+    def decrypt_record(
+        self,
+        data: Union[bytes, bytearray, memoryview],
+        password: Optional[str] = None
+    ) -> str:
+        """Decrypt a binary record of any version"""
+        record = EncryptedRecord.from_bytes(data)
+        if record.version != self.AEAD_VERSION:
+            return self.decrypt_data_aes(record.to_dict(), password)
+        
+        try:
+            key_id = record.key.hex()
+            key_header = self._key_headers.get(key_id)
+            if key_header is None:
+                raise ValueError(f"Unknown key header: {key_id}")
+            
+            key = self._header_key(key_header, password, self.AEAD_VERSION, self.AES_KEY_SIZE)
+            # Ciphertext and tag are contiguous in the buffer, so decrypt in place
+            view = memoryview(data)
+            sealed = view[len(view) - len(record.ciphertext) - len(record.tag):]
+            plaintext = self.AEAD_CIPHERS[record.cipher](key).decrypt(
+                record.iv,
+                sealed,
+                self._aead_associated_data(key_id, record.cipher)
+            )
+            
+            return plaintext.decode()
+            
+        except Exception as e:
+            raise RuntimeError(f"Decryption failed: {str(e) or type(e).__name__}")
+    
+    def encrypt_many(
+        self,
+        values: Iterable[Union[str, dict]],
+        password: Optional[str] = None,
+        mode: str = 'aes',
+        workers: Optional[int] = None,
+        chunk_size: int = 256,
+        key_header: Optional[Dict[str, str]] = None
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Encrypt many values across a process pool, yielding results in input order
+        
+        'aes' payloads are self-contained but run a full key derivation
+        per value. 'aead' and 'envelope' payloads derive the key once, but
+        only reference their key header by key_id: store the header and
+        register_key_header it before decrypting in another session.
+        
+        Args:
+            values: Values to encrypt (consumed lazily)
+            password: Optional password (uses master_key if not provided)
+            mode: 'aes' (v1.0), 'aead' (v2.0) or 'envelope' (v1.1)
+            workers: Worker processes (defaults to the CPU count; 1 runs inline)
+            chunk_size: Values sent to a worker per task
+            key_header: Header from create_key_header for the keyed modes
+                (defaults to session_key_header(password))
+            
+        Yields:
+            Encrypted payload dicts
+        """
+        if mode not in ('aead', 'envelope', 'aes'):
+            raise ValueError(f"Unsupported encryption mode: {mode}")
+        
+        options = {'password': password}
+        if mode in ('aead', 'envelope'):
+            # Share one key header so every worker derives the same key once
+            if key_header is None:
+                key_header = self.session_key_header(password)
+            options['key_header'] = key_header
+        
+        return self._map_chunks(f'_encrypt_chunk_{mode}', values, options, workers, chunk_size)
+    
+    def decrypt_many(
+        self,
+        payloads: Iterable[Dict[str, str]],
+        password: Optional[str] = None,
+        workers: Optional[int] = None,
+        chunk_size: int = 256
+    ) -> Iterator[str]:
+        """Decrypt many payloads of any version, yielding plaintexts in input order"""
+        options = {'password': password}
+        return self._map_chunks('_decrypt_chunk', payloads, options, workers, chunk_size)
+    
+    def _encrypt_chunk_aead(self, chunk: List[Any], password, key_header) -> List[Dict[str, str]]:
+        return [self.encrypt_data_aead(value, password, key_header) for value in chunk]
+    
+    def _encrypt_chunk_envelope(self, chunk: List[Any], password, key_header) -> List[Dict[str, str]]:
+        return [self.encrypt_data_envelope(value, password, key_header) for value in chunk]
+    
+    def _encrypt_chunk_aes(self, chunk: List[Any], password) -> List[Dict[str, str]]:
+        return [self.encrypt_data_aes(value, password) for value in chunk]
+    
+    def _decrypt_chunk(self, chunk: List[Dict[str, str]], password) -> List[str]:
+        return [self.decrypt_data_aes(payload, password) for payload in chunk]
+    
+    def _map_chunks(
+        self,
+        method: str,
+        items: Iterable[Any],
+        options: Dict[str, Any],
+        workers: Optional[int],
+        chunk_size: int
+    ) -> Iterator[Any]:
+        """Ordered, bounded-memory fan-out of a chunk method over a process pool"""
+        workers = workers or os.cpu_count() or 1
+        iterator = iter(items)
+        chunks = iter(lambda: list(islice(iterator, chunk_size)), [])
+        
+        if workers == 1:
+            for chunk in chunks:
+                yield from getattr(self, method)(chunk, **options)
+            return
+        
+        # Keep at most two chunks per worker in flight
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_crypto_worker,
+            initargs=(self,)
+        ) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_run_crypto_worker, method, chunk, options))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+    
+    def open_encrypted(
+        self,
+        file: Union[str, io.IOBase],
+        mode: str = 'rb',
+        password: Optional[str] = None,
+        key_header: Optional[Dict[str, str]] = None,
+        cipher: str = 'aes-256-gcm',
+        chunk_size: int = 64 * 1024
+    ) -> io.RawIOBase:
+        """
+        Open a chunked AEAD stream as a binary file-like object
+        
+        Writers encrypt fixed-size chunks as data arrives and readers
+        decrypt one chunk at a time, so memory use is bounded by
+        chunk_size regardless of file size. Each chunk is authenticated
+        separately, with its index and a final-chunk flag in the nonce,
+        so reordering and truncation are detected. The file header carries
+        the key id, salt and KDF method, so only the password is needed
+        to read it back.
+        
+        Args:
+            file: Path or binary file object
+            mode: 'rb' to decrypt or 'wb' to encrypt
+            password: Optional password (uses master_key if not provided)
+            key_header: Key header for writing (defaults to the session header)
+            cipher: 'aes-256-gcm' or 'chacha20-poly1305' (writing only)
+            chunk_size: Plaintext bytes per chunk (writing only)
+        """
+        if mode not in ('rb', 'wb'):
+            raise ValueError(f"Unsupported mode: {mode}")
+        
+        owns_file = isinstance(file, (str, os.PathLike))
+        fileobj = open(file, mode) if owns_file else file
+        
+        try:
+            if mode == 'wb':
+                if cipher not in self.AEAD_CIPHERS:
+                    raise ValueError(f"Unsupported AEAD cipher: {cipher}")
+                if key_header is None:
+                    key_header = self.session_key_header(password)
+                else:
+                    self.register_key_header(key_header)
+                
+                nonce_prefix = secrets.token_bytes(EncryptedStreamWriter.NONCE_PREFIX_SIZE)
+                header = EncryptedStreamWriter.HEADER.pack(
+                    EncryptedStreamWriter.MAGIC,
+                    EncryptedStreamWriter.VERSION,
+                    EncryptedRecord.CIPHER_IDS[cipher],
+                    EncryptedRecord.KDF_IDS[key_header['method']],
+                    bytes.fromhex(key_header['key_id']),
+                    base64.b64decode(key_header['salt']),
+                    nonce_prefix,
+                    chunk_size
+                )
+                key = self._header_key(key_header, password, 'stream', self.AES_KEY_SIZE)
+                return EncryptedStreamWriter(
+                    fileobj, self.AEAD_CIPHERS[cipher](key), header, nonce_prefix,
+                    chunk_size, owns_file, path=os.fspath(file) if owns_file else None
+                )
+            
+            header = fileobj.read(EncryptedStreamWriter.HEADER.size)
+            if len(header) < EncryptedStreamWriter.HEADER.size:
+                raise ValueError("Truncated encrypted stream header")
+            (magic, version, cipher_id, kdf_id, key_id, salt,
+             nonce_prefix, chunk_size) = EncryptedStreamWriter.HEADER.unpack(header)
+            if magic != EncryptedStreamWriter.MAGIC or version != EncryptedStreamWriter.VERSION:
+                raise ValueError("Not a Traveal encrypted stream")
+            
+            key_header = {
+                'key_id': key_id.hex(),
+                'salt': base64.b64encode(salt).decode(),
+                'method': _reverse_lookup(EncryptedRecord.KDF_IDS, kdf_id, 'KDF'),
+                'version': self.ENVELOPE_VERSION
+            }
+            self.register_key_header(key_header)
+            cipher = _reverse_lookup(EncryptedRecord.CIPHER_IDS, cipher_id, 'cipher')
+            key = self._header_key(key_header, password, 'stream', self.AES_KEY_SIZE)
+            return EncryptedStreamReader(
+                fileobj, self.AEAD_CIPHERS[cipher](key), header, nonce_prefix,
+                chunk_size, owns_file
+            )
+            
+        except Exception:
+            if owns_file:
+                fileobj.close()
+            raise
+    
+    def encrypt_file(
+        self,
+        source_path: str,
+        target_path: str,
+        password: Optional[str] = None,
+        chunk_size: int = 64 * 1024
+    ) -> str:
+        """Stream-encrypt a file with constant memory"""
+        with open(source_path, 'rb') as source, \
+                self.open_encrypted(target_path, 'wb', password, chunk_size=chunk_size) as target:
+            shutil.copyfileobj(source, target, chunk_size)
+        return target_path
+    
+    def decrypt_file(
+        self,
+        source_path: str,
+        target_path: str,
+        password: Optional[str] = None
+    ) -> str:
+        """Stream-decrypt a file produced by encrypt_file or open_encrypted"""
+        with self.open_encrypted(source_path, 'rb', password) as source, \
+                open(target_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        return target_path
+    
     def encrypt_location(
         self, 
         latitude: float, 
@@ -231,36 +1041,64 @@ class TravealCrypto:
         location_data = json.loads(decrypted)
         return location_data['lat'], location_data['lng']
     
+    @property
+    def fernet(self) -> MultiFernet:
+        """
+        Fernet cipher built once per instance
+        
+        Encrypts with the master key and decrypts with the master key or
+        any of previous_master_keys, so tokens survive key rotation.
+        """
+        if self._fernet is None:
+            if not self.master_key:
+                raise ValueError("Master key required for Fernet encryption")
+            self._fernet = MultiFernet([
+                Fernet(base64.urlsafe_b64encode(hashlib.sha256(key.encode()).digest()))
+                for key in [self.master_key] + self.previous_master_keys
+            ])
+        return self._fernet
+    
     def encrypt_with_fernet(self, data: Union[str, dict]) -> str:
         """Encrypt using Fernet (simpler, high-level encryption)"""
-        if isinstance(data, dict):
-            data = json.dumps(data, separators=(',', ':'))
-        
-        # Generate key from master key
-        if not self.master_key:
-            raise ValueError("Master key required for Fernet encryption")
-        
-        key_material = hashlib.sha256(self.master_key.encode()).digest()
-        key = base64.urlsafe_b64encode(key_material)
-        
-        fernet = Fernet(key)
-        encrypted = fernet.encrypt(data.encode())
-        
-        return base64.b64encode(encrypted).decode()
+        return base64.b64encode(self.encrypt_fernet_token(data).encode()).decode()
     
     def decrypt_with_fernet(self, encrypted_data: str) -> str:
         """Decrypt Fernet encrypted data"""
-        if not self.master_key:
-            raise ValueError("Master key required for Fernet decryption")
-        
-        key_material = hashlib.sha256(self.master_key.encode()).digest()
-        key = base64.urlsafe_b64encode(key_material)
-        
-        fernet = Fernet(key)
-        encrypted_bytes = base64.b64decode(encrypted_data)
-        decrypted = fernet.decrypt(encrypted_bytes)
-        
-        return decrypted.decode()
+        return self.decrypt_fernet_token(base64.b64decode(encrypted_data))
+    
+    def encrypt_fernet_token(self, data: Union[str, dict]) -> str:
+        """Encrypt to a raw Fernet token (no extra base64 layer)"""
+        if isinstance(data, dict):
+            data = json.dumps(data, separators=(',', ':'))
+        return self.fernet.encrypt(data.encode()).decode()
+    
+    def decrypt_fernet_token(
+        self, 
+        token: Union[str, bytes], 
+        ttl: Optional[int] = None
+    ) -> str:
+        """Decrypt a raw Fernet token, optionally rejecting tokens older than ttl seconds"""
+        if isinstance(token, str):
+            token = token.encode()
+        return self.fernet.decrypt(token, ttl=ttl).decode()
+    
+    def rotate_fernet_token(self, token: Union[str, bytes]) -> str:
+        """Re-encrypt a raw token under the current master key"""
+        if isinstance(token, str):
+            token = token.encode()
+        return self.fernet.rotate(token).decode()
+    
+    def encrypt_fernet_many(self, values: Iterable[Union[str, dict]]) -> List[str]:
+        """Encrypt many values to raw Fernet tokens"""
+        return [self.encrypt_fernet_token(value) for value in values]
+    
+    def decrypt_fernet_many(
+        self, 
+        tokens: Iterable[Union[str, bytes]], 
+        ttl: Optional[int] = None
+    ) -> List[str]:
+        """Decrypt many raw Fernet tokens"""
+        return [self.decrypt_fernet_token(token, ttl) for token in tokens]
     
     def generate_secure_hash(
         self, 
@@ -316,7 +1154,54 @@ class TravealCrypto:
         data: str, 
         level: str = 'medium'
     ) -> str:
-        """Anonymize data with different security levels"""
+        """
+        Anonymize data with different security levels
+        
+        Uses the keyed BLAKE2b pseudonymizer; each level gives a distinct,
+        stable pseudonym for the same input and master key.
+        """
+        return self._pseudonym_memo(data, level)
+    
+    def pseudonymize_many(
+        self,
+        values: Union[pd.Series, np.ndarray, list],
+        level: str = 'medium'
+    ) -> np.ndarray:
+        """
+        Pseudonymize a batch of values, hashing each distinct value once
+        
+        Values are compared by their string form, so results match
+        anonymize_data(str(value), level) row by row.
+        """
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+        pseudonyms = np.array(
+            [self._pseudonym_memo(str(value), level) for value in uniques], dtype=object
+        )
+        return pseudonyms[codes]
+    
+    def pseudonym_key(self) -> bytes:
+        """Key of the pseudonym hash, derived from the master key on first use"""
+        if self._pseudonym_key is None:
+            self._pseudonym_key = self.derive_key_pbkdf2(
+                self.master_key or 'default', b'traveal-pseudonym-v1'
+            )
+        return self._pseudonym_key
+    
+    def _pseudonymize(self, data: str, level: str) -> str:
+        """Single-pass keyed BLAKE2b pseudonym, personalized by level"""
+        return hashlib.blake2b(
+            data.encode(),
+            digest_size=32,
+            key=self.pseudonym_key(),
+            person=f"traveal-{level}".encode()[:16]
+        ).hexdigest()
+    
+    def anonymize_data_legacy(
+        self, 
+        data: str, 
+        level: str = 'medium'
+    ) -> str:
+        """Previous multi-round SHA-256 anonymization, kept for migrating stored hashes"""
         levels = {
             'low': 1,
             'medium': 3,
@@ -352,9 +1237,187 @@ class TravealCrypto:
             data = secrets.token_hex(len(data))
 
 
+class EncryptedStreamWriter(io.RawIOBase):
+    """Write-side of the chunked AEAD stream format (see TravealCrypto.open_encrypted)"""
+    
+    MAGIC = b'TVEF'
+    VERSION = 1
+    NONCE_PREFIX_SIZE = 7
+    TAG_SIZE = 16
+    # magic, version, cipher id, KDF id, key id, salt, nonce prefix, chunk size
+    HEADER = struct.Struct('>4sBBB8s32s7sI')
+    
+    def __init__(self, fileobj, aead, header: bytes, nonce_prefix: bytes,
+                 chunk_size: int, owns_file: bool = False, path: Optional[str] = None):
+        super().__init__()
+        self._file = fileobj
+        self._aead = aead
+        self._header = header
+        self._nonce_prefix = nonce_prefix
+        self._chunk_size = chunk_size
+        self._owns_file = owns_file
+        self._path = path
+        self._buffer = bytearray()
+        self._index = 0
+        self._position = 0
+        self._file.write(header)
+    
+    def writable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        self._buffer += data
+        # Hold back a full chunk so the final chunk is never empty unless the stream is
+        while len(self._buffer) > self._chunk_size:
+            self._seal(self._buffer[:self._chunk_size], final=False)
+            del self._buffer[:self._chunk_size]
+        written = len(data) if not isinstance(data, memoryview) else data.nbytes
+        self._position += written
+        return written
+    
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            self._seal(self._buffer, final=True)
+            self._buffer = bytearray()
+            self._file.flush()
+            if self._owns_file:
+                self._file.close()
+        finally:
+            super().close()
+    
+    def abort(self) -> None:
+        """
+        Stop writing without sealing the final chunk
+        
+        The stream is left truncated, so readers reject it; a file opened
+        by path is removed.
+        """
+        if self.closed:
+            return
+        try:
+            self._buffer = bytearray()
+            if self._owns_file:
+                self._file.close()
+                if self._path is not None and os.path.exists(self._path):
+                    os.remove(self._path)
+        finally:
+            super().close()
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # A block that failed must not produce a stream that reads as complete
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+    
+    def _seal(self, chunk: bytes, final: bool) -> None:
+        nonce = _stream_nonce(self._nonce_prefix, self._index, final)
+        self._file.write(self._aead.encrypt(nonce, bytes(chunk), self._header))
+        self._index += 1
+
+
+class EncryptedStreamReader(io.RawIOBase):
+    """Read-side of the chunked AEAD stream format (see TravealCrypto.open_encrypted)"""
+    
+    def __init__(self, fileobj, aead, header: bytes, nonce_prefix: bytes,
+                 chunk_size: int, owns_file: bool = False):
+        super().__init__()
+        self._file = fileobj
+        self._aead = aead
+        self._header = header
+        self._nonce_prefix = nonce_prefix
+        self._record_size = chunk_size + EncryptedStreamWriter.TAG_SIZE
+        self._owns_file = owns_file
+        self._plaintext = memoryview(b'')
+        self._lookahead = b''
+        self._index = 0
+        self._finished = False
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not self._plaintext and not self._finished:
+            self._open_next_chunk()
+        
+        count = min(len(buffer), len(self._plaintext))
+        buffer[:count] = self._plaintext[:count]
+        self._plaintext = self._plaintext[count:]
+        return count
+    
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._owns_file:
+                self._file.close()
+        finally:
+            super().close()
+    
+    def _open_next_chunk(self) -> None:
+        # Read one byte past the record to learn whether it is the last one
+        record = self._lookahead + self._file.read(self._record_size + 1 - len(self._lookahead))
+        final = len(record) <= self._record_size
+        record, self._lookahead = record[:self._record_size], record[self._record_size:]
+        
+        if len(record) < EncryptedStreamWriter.TAG_SIZE:
+            raise ValueError("Truncated encrypted stream")
+        
+        nonce = _stream_nonce(self._nonce_prefix, self._index, final)
+        try:
+            self._plaintext = memoryview(self._aead.decrypt(nonce, record, self._header))
+        except Exception:
+            raise ValueError(f"Encrypted stream chunk {self._index} failed authentication")
+        self._index += 1
+        self._finished = final
+
+
+def _stream_nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    """7-byte random prefix, 4-byte chunk counter, 1-byte final flag"""
+    return prefix + struct.pack('>IB', index, 1 if final else 0)
+
+
+# Per-process TravealCrypto used by encrypt_many/decrypt_many workers
+_WORKER_CRYPTO: Optional[TravealCrypto] = None
+
+
+def _init_crypto_worker(crypto: TravealCrypto) -> None:
+    global _WORKER_CRYPTO
+    _WORKER_CRYPTO = crypto
+
+
+def _run_crypto_worker(method: str, chunk: List[Any], options: Dict[str, Any]) -> List[Any]:
+    return getattr(_WORKER_CRYPTO, method)(chunk, **options)
+
+
+# Per-process TravealDataProcessor used by anonymize_pool workers
+_WORKER_PROCESSOR: Optional['TravealDataProcessor'] = None
+
+
+def _init_anonymize_worker(processor: 'TravealDataProcessor') -> None:
+    global _WORKER_PROCESSOR
+    _WORKER_PROCESSOR = processor
+
+
+def _run_anonymize_worker(df: pd.DataFrame, anonymization_level: str) -> pd.DataFrame:
+    return _WORKER_PROCESSOR.anonymize_trip_frame(df, anonymization_level)
+
+
 class TravealDataProcessor:
     """Data processing utilities for analytics and machine learning"""
     
+    SENSITIVE_FIELDS = [
+        'email', 'phone', 'name', 'address', 
+        'device_id', 'ip_address'
+    ]
+    
     def __init__(self, crypto: TravealCrypto):
         self.crypto = crypto
     
@@ -405,7 +1468,6 @@ class TravealDataProcessor:
         
         # Round timestamps to nearest hour
         if 'start_time' in trip_data:
-            import datetime
             start_time = datetime.datetime.fromisoformat(trip_data['start_time'])
             rounded_hour = start_time.replace(minute=0, second=0, microsecond=0)
             anonymized['start_hour'] = rounded_hour.isoformat()
@@ -415,27 +1477,172 @@ class TravealDataProcessor:
         
         return anonymized
     
+    def anonymize_pool(self, workers: int) -> ProcessPoolExecutor:
+        """
+        Process pool for anonymize_trip_frame, reusable across many frames
+        
+        Each worker receives this processor once, with the pseudonym key
+        already derived, and keeps its pseudonym memo between frames.
+        """
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_anonymize_worker,
+            initargs=(self,)
+        )
+    
+    def anonymize_trip_frame(
+        self,
+        df: pd.DataFrame,
+        anonymization_level: str = 'medium',
+        workers: int = 1,
+        executor: Optional[ProcessPoolExecutor] = None
+    ) -> pd.DataFrame:
+        """
+        Anonymize a whole trip DataFrame using column operations
+        
+        Produces the same columns as anonymize_trip_data applied row by row.
+        
+        Args:
+            df: Raw trip data
+            anonymization_level: Anonymization level for user hashes
+            workers: Number of processes to split the frame across
+            executor: Pool from anonymize_pool to run on (a pool is
+                created for this call if not provided)
+            
+        Returns:
+            Anonymized trip DataFrame
+        """
+        if workers > 1 and len(df) > workers:
+            parts = np.array_split(np.arange(len(df)), workers)
+            with ExitStack() as stack:
+                if executor is None:
+                    executor = stack.enter_context(self.anonymize_pool(workers))
+                frames = executor.map(
+                    _run_anonymize_worker,
+                    [df.iloc[idx] for idx in parts],
+                    [anonymization_level] * len(parts)
+                )
+                return pd.concat(list(frames), ignore_index=True)
+        
+        anonymized = pd.DataFrame(index=pd.RangeIndex(len(df)))
+        
+        # Pseudonymize user ids (each distinct id is hashed once)
+        if 'user_id' in df.columns:
+            anonymized['user_hash'] = self.crypto.pseudonymize_many(
+                df['user_id'], anonymization_level
+            )
+        
+        preservable_fields = [
+            'distance', 'duration', 'mode', 'purpose', 
+            'companions', 'weather', 'time_of_day'
+        ]
+        
+        for field in preservable_fields:
+            if field in df.columns:
+                anonymized[field] = df[field].to_numpy()
+        
+        # Fuzzy location data (±100m noise, truncated to 0.001° zones)
+        rng = np.random.default_rng(secrets.randbits(128))
+        for source, target in (('start_location', 'start_area'),
+                               ('end_location', 'end_area')):
+            if source not in df.columns:
+                continue
+            present = df[source].notna().to_numpy()
+            coords = np.full((len(df), 2), np.nan)
+            if present.any():
+                coords[present] = np.array(df[source][present].tolist(), dtype=float)
+            noise = rng.integers(-100, 100, size=coords.shape)
+            zones = np.trunc(coords * 1000 + noise) / 1000
+            anonymized[target] = [
+                {'lat_zone': lat, 'lng_zone': lng} if ok else None
+                for lat, lng, ok in zip(zones[:, 0].tolist(), zones[:, 1].tolist(), present)
+            ]
+        
+        # Round timestamps to the hour, formatting each distinct hour once
+        if 'start_time' in df.columns:
+            hours = pd.to_datetime(df['start_time'], format='ISO8601').dt.floor('h')
+            codes, uniques = pd.factorize(hours)
+            iso_hours = np.array([ts.isoformat() for ts in uniques] + [None], dtype=object)
+            anonymized['start_hour'] = iso_hours[codes]
+        
+        anonymized['anonymized_at'] = datetime.datetime.utcnow().isoformat()
+        anonymized['anonymization_level'] = anonymization_level
+        
+        return anonymized
+    
     def encrypt_sensitive_fields(
         self, 
         data: Dict[str, Any],
-        sensitive_fields: list = None
+        sensitive_fields: list = None,
+        use_envelope: bool = False
     ) -> Dict[str, Any]:
-        """Encrypt sensitive fields in data"""
+        """
+        Encrypt sensitive fields in data
+        
+        With use_envelope, fields are encrypted under the crypto session's
+        cached data key instead of running a full key derivation per field;
+        persist crypto.session_key_header() to decrypt them later.
+        """
         if sensitive_fields is None:
-            sensitive_fields = [
-                'email', 'phone', 'name', 'address', 
-                'device_id', 'ip_address'
-            ]
+            sensitive_fields = self.SENSITIVE_FIELDS
         
         result = data.copy()
         
         for field in sensitive_fields:
             if field in result:
-                encrypted = self.crypto.encrypt_data_aes(str(result[field]))
+                if use_envelope:
+                    encrypted = self.crypto.encrypt_data_envelope(str(result[field]))
+                else:
+                    encrypted = self.crypto.encrypt_data_aes(str(result[field]))
                 result[f"{field}_encrypted"] = encrypted
                 del result[field]  # Remove original
         
         return result
+    
+    def encrypt_sensitive_records(
+        self,
+        records: Iterable[Dict[str, Any]],
+        sensitive_fields: list = None,
+        mode: str = 'aes',
+        workers: Optional[int] = None,
+        chunk_size: int = 256,
+        key_header: Optional[Dict[str, str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        encrypt_sensitive_fields over a stream of records using encrypt_many
+        
+        Records are yielded in input order with the same shape as
+        encrypt_sensitive_fields produces. Like use_envelope there, the
+        faster 'aead' and 'envelope' modes need the key header persisted
+        (key_header, or crypto.session_key_header()) to decrypt later.
+        """
+        if sensitive_fields is None:
+            sensitive_fields = self.SENSITIVE_FIELDS
+        
+        # Records whose field values have been handed to the pool, oldest first
+        pending = deque()
+        
+        def field_values() -> Iterator[str]:
+            for record in records:
+                result = record.copy()
+                present = [field for field in sensitive_fields if field in result]
+                pending.append((result, present))
+                for field in present:
+                    yield str(result.pop(field))
+        
+        encrypted_values = self.crypto.encrypt_many(
+            field_values(), mode=mode, workers=workers, chunk_size=chunk_size,
+            key_header=key_header
+        )
+        
+        for encrypted in encrypted_values:
+            while not pending[0][1]:
+                yield pending.popleft()[0]
+            result, present = pending[0]
+            result[f"{present.pop(0)}_encrypted"] = encrypted
+        
+        while pending:
+            yield pending.popleft()[0]
 
 
 # Example usage and testing functions
@@ -459,9 +1666,49 @@ def test_encryption():
     assert abs(lng - decrypted_lng) < 0.0001
     print("✓ Location encryption test passed")
     
+    # Test envelope encryption and v1.0 compatibility
+    envelope = crypto.encrypt_data_envelope(test_data)
+    assert json.loads(crypto.decrypt_data_aes(envelope)) == test_data
+    assert json.loads(decrypted) == test_data
+    print("✓ Envelope encryption test passed")
+    
+    # Test AEAD (v2.0) encryption with both ciphers
+    for cipher in TravealCrypto.AEAD_CIPHERS:
+        sealed = crypto.encrypt_data_aead(test_data, cipher=cipher)
+        assert json.loads(crypto.decrypt_data_aes(sealed)) == test_data
+    print("✓ AEAD encryption test passed")
+    
+    # Test compact binary records and the dict adapter
+    record = crypto.encrypt_record(test_data)
+    assert json.loads(crypto.decrypt_record(record)) == test_data
+    assert EncryptedRecord.from_dict(encrypted).to_dict() == encrypted
+    print("✓ Binary record test passed")
+    
+    # Test chunked stream encryption round trip
+    buffer = io.BytesIO()
+    with crypto.open_encrypted(buffer, 'wb', chunk_size=16) as stream:
+        stream.write(b"Streaming export rows\n" * 10)
+    ciphertext = buffer.getvalue()
+    with crypto.open_encrypted(io.BytesIO(ciphertext), 'rb') as stream:
+        assert stream.read() == b"Streaming export rows\n" * 10
+    print("✓ Stream encryption test passed")
+    
+    # Test Fernet tokens, including decryption after key rotation
+    token = crypto.encrypt_fernet_token(test_data)
+    assert json.loads(crypto.decrypt_with_fernet(crypto.encrypt_with_fernet(test_data))) == test_data
+    rotated = TravealCrypto("rotated-master-key", previous_master_keys=["test-master-key-123"])
+    assert json.loads(rotated.decrypt_fernet_token(token)) == test_data
+    assert json.loads(rotated.decrypt_fernet_token(rotated.rotate_fernet_token(token))) == test_data
+    print("✓ Fernet encryption test passed")
+    
     # Test hash generation
     hash_data = crypto.generate_secure_hash("test-password")
-    is_valid = crypto.verify_hash("test-password", **hash_data)
+    is_valid = crypto.verify_hash(
+        "test-password",
+        hash_data['hash'],
+        hash_data['salt'],
+        int(hash_data['iterations'])
+    )
     assert is_valid
     print("✓ Hash verification test passed")
     
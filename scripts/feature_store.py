@@ -0,0 +1,165 @@
+"""
+Trip Feature Store for Traveal
+Numeric ML features materialized once per dataset as memory-mapped .npy files
+"""
+
+import os
+import hashlib
+from dataclasses import dataclass
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+
+from trip_schema import ZONE_COLUMNS, trip_zones
+
+
+# Column order of the feature matrix. The model feature lists are prefixes of
+# it, so the ML stages get contiguous column slices (views) rather than copies.
+FEATURE_COLUMNS = [
+    'distance', 'duration', 'hour', 'day_of_week', 'companions',
+    'start_lat', 'start_lng', 'end_lat', 'end_lng'
+]
+
+
+@dataclass
+class FeatureMatrix:
+    """Column-major float matrix of trip features, with NaN for missing values"""
+    values: np.ndarray
+    columns: List[str]
+
+    def __post_init__(self):
+        self._available = None
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'FeatureMatrix':
+        """Build the feature matrix from a trip DataFrame"""
+        values = np.full((len(df), len(FEATURE_COLUMNS)), np.nan, order='F')
+        index = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+        for name in ('distance', 'duration', 'companions'):
+            if name in df.columns:
+                values[:, index[name]] = pd.to_numeric(df[name], errors='coerce')
+
+        if 'start_hour' in df.columns:
+            start_times = pd.to_datetime(df['start_hour'], format='ISO8601')
+            values[:, index['hour']] = start_times.dt.hour
+            values[:, index['day_of_week']] = start_times.dt.dayofweek
+        else:
+            for name in ('hour', 'day_of_week'):
+                if name in df.columns:
+                    values[:, index[name]] = pd.to_numeric(df[name], errors='coerce')
+
+        for prefix in ZONE_COLUMNS.values():
+            zones = trip_zones(df, prefix)
+            if zones is not None:
+                values[:, index[f'{prefix}_lat']] = zones[0]
+                values[:, index[f'{prefix}_lng']] = zones[1]
+
+        return cls(values, list(FEATURE_COLUMNS))
+
+    def column(self, name: str) -> np.ndarray:
+        """A single feature column (a view)"""
+        return self.values[:, self.columns.index(name)]
+
+    def select(self, names: List[str]) -> np.ndarray:
+        """
+        Columns in the given order
+
+        Adjacent columns are returned as a view into the matrix; any other
+        selection is copied.
+        """
+        positions = [self.columns.index(name) for name in names]
+        start = positions[0] if positions else 0
+        if positions == list(range(start, start + len(positions))):
+            return self.values[:, start:start + len(positions)]
+        return self.values[:, positions]
+
+    def available(self) -> List[str]:
+        """Features with at least one non-missing value"""
+        if self._available is None:
+            present = ~np.isnan(self.values).all(axis=0)
+            self._available = [name for name, ok in zip(self.columns, present) if ok]
+        return self._available
+
+
+class FeatureStore:
+    """Directory of feature matrices keyed by dataset fingerprint"""
+
+    def __init__(self, directory: str, max_entries: int = 8):
+        """
+        Args:
+            directory: Where .npy files are written
+            max_entries: Matrices kept on disk; the least recently
+                written are removed first
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"features_{fingerprint}.npy")
+
+    def load(self, fingerprint: str) -> Optional[FeatureMatrix]:
+        """Memory-map a stored matrix, if present"""
+        path = self._path(fingerprint)
+        if not os.path.exists(path):
+            return None
+        return FeatureMatrix(np.load(path, mmap_mode='r'), list(FEATURE_COLUMNS))
+
+    def save(self, fingerprint: str, matrix: FeatureMatrix) -> None:
+        """Write a matrix and drop the oldest entries beyond max_entries"""
+        path = self._path(fingerprint)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, matrix.values)
+        os.replace(tmp_path, path)
+
+        entries = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory)
+             if name.startswith('features_') and name.endswith('.npy')),
+            key=os.path.getmtime
+        )
+        for stale in entries[:-self.max_entries]:
+            os.remove(stale)
+
+    def load_or_build(self, df: pd.DataFrame) -> FeatureMatrix:
+        """Reuse the stored matrix for this dataset or build and store it"""
+        fingerprint = dataset_fingerprint(df)
+        matrix = self.load(fingerprint)
+        if matrix is None:
+            self.save(fingerprint, FeatureMatrix.from_frame(df))
+            matrix = self.load(fingerprint)
+        return matrix
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Content hash of the columns the feature matrix is built from
+
+    Zones are hashed as the float coordinates the matrix is built from,
+    whether stored as nested dicts or as flat normalized columns.
+    """
+    sources = ['distance', 'duration', 'companions']
+    if 'start_hour' in df.columns:
+        sources.append('start_hour')
+    else:
+        sources += ['hour', 'day_of_week']
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{len(df)}:{','.join(FEATURE_COLUMNS)}".encode())
+    for name in sources:
+        if name not in df.columns:
+            continue
+        digest.update(name.encode())
+        digest.update(pd.util.hash_pandas_object(df[name], index=False).to_numpy().tobytes())
+
+    for prefix in ZONE_COLUMNS.values():
+        zones = trip_zones(df, prefix)
+        if zones is not None:
+            digest.update(prefix.encode())
+            for values in zones:
+                digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    return digest.hexdigest()
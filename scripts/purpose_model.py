@@ -0,0 +1,301 @@
+"""
+Trip Purpose Model Store for Traveal
+Train, persist and reuse the trip purpose classifier across reports
+"""
+
+import os
+import json
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Union
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.preprocessing import LabelEncoder
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
+
+from feature_store import FeatureMatrix
+
+
+MODEL_FORMAT_VERSION = '1.0'
+
+# Candidate features, in the order they are fed to the model
+PURPOSE_FEATURES = ['distance', 'duration', 'hour', 'day_of_week', 'companions']
+
+
+@dataclass
+class PurposeModel:
+    """A fitted purpose classifier with its label encoder and feature list"""
+    model: RandomForestClassifier
+    label_encoder: LabelEncoder
+    features: List[str]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def feature_matrix(self, trips: Union[pd.DataFrame, FeatureMatrix]) -> np.ndarray:
+        """Build the model input, filling gaps with training medians"""
+        if isinstance(trips, pd.DataFrame):
+            # Same derivation as training, e.g. hour and day_of_week from start_hour
+            trips = FeatureMatrix.from_frame(trips)
+
+        X = trips.select(self.features)
+        missing = np.isnan(X)
+        if not missing.any():
+            return X
+        medians = self.metadata.get('feature_medians', {})
+        fill = np.array([medians.get(name, 0) for name in self.features], dtype=float)
+        return np.where(missing, fill, X)
+
+    def predict(self, df: pd.DataFrame, batch_size: int = 500000) -> pd.Series:
+        """Label trips with a predicted purpose, batch by batch"""
+        labels = np.empty(len(df), dtype=object)
+        for start in range(0, len(df), batch_size):
+            batch = df.iloc[start:start + batch_size]
+            encoded = self.model.predict(self.feature_matrix(batch))
+            labels[start:start + len(batch)] = self.label_encoder.inverse_transform(encoded)
+        return pd.Series(labels, index=df.index, name='predicted_purpose')
+
+    def holdout_evaluation(self) -> Dict[str, Any]:
+        """
+        Evaluation on the hold-out split saved at training time
+
+        Unlike evaluate, this never scores rows the model was trained on.
+        """
+        evaluation = self.metadata.get('evaluation')
+        if evaluation is None:
+            # Models stored before evaluations were saved
+            return {'model_accuracy': self.metadata['model_accuracy']}
+        return dict(evaluation)
+
+    def evaluate(self,
+                 df: pd.DataFrame,
+                 matrix: Optional[FeatureMatrix] = None) -> Dict[str, Any]:
+        """Score the model against labeled trips in predict_trip_purpose format"""
+        known = df['purpose'].isin(self.label_encoder.classes_).to_numpy()
+        if not known.any():
+            return {"error": "No labeled trips with known purposes"}
+
+        if matrix is not None:
+            X = self.feature_matrix(matrix)[known]
+        else:
+            X = self.feature_matrix(df[known])
+        y = self.label_encoder.transform(df['purpose'][known])
+        return _evaluation(self.model, self.label_encoder, self.features, X, y)
+
+
+class TripPurposeModelStore:
+    """Versioned on-disk store of PurposeModel instances"""
+
+    def __init__(self,
+                 directory: str,
+                 max_age_days: float = 30,
+                 drift_threshold: float = 0.5,
+                 n_jobs: int = -1):
+        """
+        Args:
+            directory: Where model files are written
+            max_age_days: Retrain once the latest model is older than this
+            drift_threshold: Retrain once any feature mean moves by more
+                than this many training standard deviations
+            n_jobs: Parallel jobs for training and prediction (-1 = all cores)
+        """
+        self.directory = directory
+        self.max_age_days = max_age_days
+        self.drift_threshold = drift_threshold
+        self.n_jobs = n_jobs
+        self._cached: Optional[PurposeModel] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, version: int) -> Dict[str, str]:
+        base = os.path.join(self.directory, f"purpose_model_v{version}")
+        return {'model': f"{base}.joblib", 'metadata': f"{base}.json"}
+
+    def versions(self) -> List[int]:
+        """List stored model versions in ascending order"""
+        versions = []
+        for name in os.listdir(self.directory):
+            if name.startswith('purpose_model_v') and name.endswith('.json'):
+                versions.append(int(name[len('purpose_model_v'):-len('.json')]))
+        return sorted(versions)
+
+    def train(self,
+              df: pd.DataFrame,
+              matrix: Optional[FeatureMatrix] = None) -> Dict[str, Any]:
+        """
+        Fit a new model on labeled trips and persist it as the next version
+
+        Returns:
+            Hold-out evaluation in predict_trip_purpose format
+        """
+        result = fit_purpose_model(df, n_jobs=self.n_jobs, matrix=matrix)
+        if 'error' in result:
+            return result
+
+        purpose_model = result.pop('model')
+        versions = self.versions()
+        version = versions[-1] + 1 if versions else 1
+        purpose_model.metadata.update({
+            'format_version': MODEL_FORMAT_VERSION,
+            'model_version': version,
+            'model_accuracy': result['model_accuracy'],
+            'evaluation': result
+        })
+
+        paths = self._paths(version)
+        joblib.dump(
+            (purpose_model.model, purpose_model.label_encoder, purpose_model.features),
+            paths['model']
+        )
+        with open(paths['metadata'], 'w') as f:
+            json.dump(purpose_model.metadata, f, indent=2)
+
+        self._cached = purpose_model
+        result['model_version'] = version
+        return result
+
+    def load(self, version: Optional[int] = None) -> Optional[PurposeModel]:
+        """Load a model version (latest by default), or None if none exist"""
+        if version is None:
+            versions = self.versions()
+            if not versions:
+                return None
+            version = versions[-1]
+
+        if self._cached is not None and self._cached.metadata.get('model_version') == version:
+            return self._cached
+
+        paths = self._paths(version)
+        model, label_encoder, features = joblib.load(paths['model'])
+        with open(paths['metadata']) as f:
+            metadata = json.load(f)
+
+        model.set_params(n_jobs=self.n_jobs)
+        self._cached = PurposeModel(model, label_encoder, features, metadata)
+        return self._cached
+
+    def predict(self, df: pd.DataFrame, batch_size: int = 500000) -> pd.Series:
+        """Label trips with the latest stored model"""
+        purpose_model = self.load()
+        if purpose_model is None:
+            raise ValueError("No trained purpose model available")
+        return purpose_model.predict(df, batch_size)
+
+    def needs_retrain(self,
+                      df: pd.DataFrame,
+                      matrix: Optional[FeatureMatrix] = None) -> bool:
+        """Check model age, feature drift and unseen purposes against new trips"""
+        purpose_model = self.load()
+        if purpose_model is None:
+            return True
+
+        metadata = purpose_model.metadata
+        trained_at = datetime.fromisoformat(metadata['trained_at'])
+        if (datetime.utcnow() - trained_at).total_seconds() > self.max_age_days * 86400:
+            return True
+
+        if 'purpose' in df.columns:
+            seen = set(purpose_model.label_encoder.classes_)
+            if set(df['purpose'].dropna().unique()) - seen:
+                return True
+
+        if matrix is None:
+            matrix = FeatureMatrix.from_frame(df)
+        for name in purpose_model.features:
+            column = matrix.column(name)
+            if np.isnan(column).all():
+                continue
+            current = np.nanmean(column)
+            scale = metadata['feature_stds'].get(name) or 1.0
+            if abs(current - metadata['feature_means'][name]) / scale > self.drift_threshold:
+                return True
+
+        return False
+
+
+def fit_purpose_model(df: pd.DataFrame,
+                      n_estimators: int = 100,
+                      n_jobs: int = -1,
+                      matrix: Optional[FeatureMatrix] = None) -> Dict[str, Any]:
+    """
+    Fit a RandomForest purpose classifier on a hold-out split
+
+    Args:
+        matrix: Cached features for `df`; built from its columns if omitted
+
+    Returns:
+        predict_trip_purpose style evaluation plus the fitted PurposeModel
+        under 'model', or a dict with an 'error' key
+    """
+    if matrix is None:
+        matrix = FeatureMatrix.from_frame(df)
+    features = [name for name in PURPOSE_FEATURES if name in matrix.available()]
+
+    if len(features) < 2:
+        return {"error": "Insufficient features for purpose prediction"}
+
+    # Prepare data
+    X = matrix.select(features)
+    complete = ~np.isnan(X).any(axis=1) & df['purpose'].notna().to_numpy()
+    X = X[complete]
+    y = df['purpose'][complete]
+
+    if len(X) < 50:
+        return {"error": "Insufficient data for training"}
+
+    # Encode labels
+    label_encoder = LabelEncoder()
+    y_encoded = label_encoder.fit_transform(y)
+
+    # Split data
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
+    )
+
+    # Train Random Forest
+    rf_model = RandomForestClassifier(
+        n_estimators=n_estimators,
+        random_state=42,
+        max_depth=10,
+        n_jobs=n_jobs
+    )
+
+    rf_model.fit(X_train, y_train)
+
+    stats = pd.DataFrame(X, columns=features)
+    metadata = {
+        'trained_at': datetime.utcnow().isoformat(),
+        'training_samples': len(X_train),
+        'features': features,
+        'classes': label_encoder.classes_.tolist(),
+        'feature_means': stats.mean().to_dict(),
+        'feature_stds': stats.std().fillna(0).to_dict(),
+        'feature_medians': stats.median().to_dict()
+    }
+
+    result = _evaluation(rf_model, label_encoder, features, X_test, y_test)
+    result['model'] = PurposeModel(rf_model, label_encoder, features, metadata)
+    return result
+
+
+def _evaluation(model: RandomForestClassifier,
+                label_encoder: LabelEncoder,
+                features: List[str],
+                X: np.ndarray,
+                y: np.ndarray) -> Dict[str, Any]:
+    """Accuracy, importances and per-class report for a fitted model"""
+    y_pred = model.predict(X)
+    labels = np.arange(len(label_encoder.classes_))
+
+    return {
+        'model_accuracy': model.score(X, y),
+        'feature_importance': dict(zip(features, model.feature_importances_)),
+        'classification_report': classification_report(
+            y, y_pred,
+            labels=labels,
+            target_names=label_encoder.classes_,
+            output_dict=True,
+            zero_division=0
+        ),
+        'prediction_confidence': model.predict_proba(X).max(axis=1).mean()
+    }
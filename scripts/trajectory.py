@@ -0,0 +1,284 @@
+"""
+Trip Trajectories for Traveal
+Batch processing of raw LocationPoint GPS fixes as contiguous NumPy arrays
+"""
+
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+
+# Same mean Earth radius as the backend's calculateDistance
+EARTH_RADIUS_M = 6371000.0
+
+# Segments slower than this (m/s, ~1.8 km/h) count as standing still
+STATIONARY_SPEED = 0.5
+
+
+def haversine(lat1: np.ndarray,
+              lng1: np.ndarray,
+              lat2: np.ndarray,
+              lng2: np.ndarray) -> np.ndarray:
+    """Great-circle distance in meters between arrays of degree coordinates"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float))
+                              for v in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+@dataclass
+class TripTrajectories:
+    """
+    Location points of many trips in flat arrays, grouped by trip
+
+    Points of trip i are lat/lng/times[offsets[i]:offsets[i + 1]], in
+    timestamp order. Times are nanoseconds since the epoch (UTC).
+    """
+    trip_ids: np.ndarray
+    offsets: np.ndarray
+    lat: np.ndarray
+    lng: np.ndarray
+    times: np.ndarray
+
+    def __post_init__(self):
+        self._distances = None
+        self._durations = None
+
+    def __len__(self) -> int:
+        return len(self.trip_ids)
+
+    @classmethod
+    def from_frame(cls,
+                   points: pd.DataFrame,
+                   trip_column: str = 'tripId',
+                   lat_column: str = 'latitude',
+                   lng_column: str = 'longitude',
+                   time_column: str = 'timestamp') -> 'TripTrajectories':
+        """
+        Group location points (the location_points table) by trip
+
+        Points without coordinates or timestamp are dropped.
+        """
+        times = pd.to_datetime(points[time_column], format='ISO8601', utc=True)
+        lat = pd.to_numeric(points[lat_column], errors='coerce').to_numpy(dtype=float)
+        lng = pd.to_numeric(points[lng_column], errors='coerce').to_numpy(dtype=float)
+        codes, trip_ids = pd.factorize(points[trip_column], sort=True)
+
+        valid = (codes >= 0) & ~np.isnan(lat) & ~np.isnan(lng) & times.notna().to_numpy()
+        nanos = times.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        codes, lat, lng, nanos = codes[valid], lat[valid], lng[valid], nanos[valid]
+
+        order = np.lexsort((nanos, codes))
+        counts = np.bincount(codes, minlength=len(trip_ids))
+        return cls(
+            trip_ids=np.asarray(trip_ids),
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            lat=np.ascontiguousarray(lat[order]),
+            lng=np.ascontiguousarray(lng[order]),
+            times=np.ascontiguousarray(nanos[order])
+        )
+
+    def point_counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def _first_points(self) -> np.ndarray:
+        """Mask of points that start a trip (they have no incoming segment)"""
+        first = np.zeros(len(self.lat), dtype=bool)
+        first[self.offsets[:-1][self.point_counts() > 0]] = True
+        return first
+
+    def _per_trip(self, values: np.ndarray, ufunc: np.ufunc = np.add,
+                  empty: float = 0.0) -> np.ndarray:
+        """Reduce per-point values to one value per trip"""
+        result = np.full(len(self), empty, dtype=float)
+        nonempty = self.point_counts() > 0
+        if nonempty.any():
+            result[nonempty] = ufunc.reduceat(values, self.offsets[:-1][nonempty])
+        return result
+
+    def segment_distances(self) -> np.ndarray:
+        """Meters from the previous point of the same trip (0 for first points)"""
+        if self._distances is None:
+            distances = np.zeros(len(self.lat))
+            if len(self.lat) > 1:
+                distances[1:] = haversine(self.lat[:-1], self.lng[:-1],
+                                          self.lat[1:], self.lng[1:])
+            distances[self._first_points()] = 0.0
+            self._distances = distances
+        return self._distances
+
+    def segment_durations(self) -> np.ndarray:
+        """Seconds since the previous point of the same trip (0 for first points)"""
+        if self._durations is None:
+            durations = np.zeros(len(self.times))
+            if len(self.times) > 1:
+                durations[1:] = np.diff(self.times) / 1e9
+            durations[self._first_points()] = 0.0
+            self._durations = durations
+        return self._durations
+
+    def speeds(self) -> np.ndarray:
+        """Segment speeds in m/s; NaN for first points and repeated timestamps"""
+        durations = self.segment_durations()
+        speeds = np.full(len(durations), np.nan)
+        moving = durations > 0
+        speeds[moving] = self.segment_distances()[moving] / durations[moving]
+        return speeds
+
+    def dwell_times(self,
+                    max_speed: float = STATIONARY_SPEED,
+                    min_duration: float = 120.0) -> np.ndarray:
+        """
+        Seconds per trip spent in stops
+
+        A stop is a run of consecutive segments slower than max_speed
+        lasting at least min_duration seconds.
+        """
+        durations = self.segment_durations()
+        with np.errstate(invalid='ignore'):
+            slow = self.speeds() < max_speed
+        if not slow.any():
+            return np.zeros(len(self))
+
+        # Number the runs of slow segments; first points have no speed, so
+        # runs never span two trips
+        starts = slow & ~np.concatenate([[False], slow[:-1]])
+        run_ids = np.cumsum(starts)[slow] - 1
+        run_durations = np.bincount(run_ids, weights=durations[slow])
+
+        run_trips = np.searchsorted(self.offsets, np.flatnonzero(starts), side='right') - 1
+        stops = run_durations >= min_duration
+        return np.bincount(run_trips[stops], weights=run_durations[stops], minlength=len(self))
+
+    def trip_metrics(self) -> pd.DataFrame:
+        """
+        Distance and duration of every trip derived from its points
+
+        Returns:
+            DataFrame indexed by trip id with distance (meters, like
+            Trip.distance), duration (minutes), point_count, dwell_time
+            (seconds) and max_speed (m/s)
+        """
+        counts = self.point_counts()
+        nonempty = counts > 0
+        duration = np.zeros(len(self))
+        duration[nonempty] = (self.times[self.offsets[1:][nonempty] - 1]
+                              - self.times[self.offsets[:-1][nonempty]]) / 1e9 / 60
+
+        # fmax skips the NaN speeds of first points and repeated timestamps
+        max_speed = self._per_trip(self.speeds(), np.fmax, empty=np.nan)
+
+        return pd.DataFrame({
+            'distance': self._per_trip(self.segment_distances()),
+            'duration': duration,
+            'point_count': counts,
+            'dwell_time': self.dwell_times(),
+            'max_speed': max_speed
+        }, index=pd.Index(self.trip_ids, name='trip_id'))
+
+    def simplify(self, tolerance: float = 10.0) -> 'TripTrajectories':
+        """
+        Douglas-Peucker simplification of every track
+
+        Args:
+            tolerance: Maximum distance in meters between a dropped point
+                and the simplified track
+        """
+        keep = self.simplify_mask(tolerance)
+        trips = np.repeat(np.arange(len(self)), self.point_counts())
+        kept_counts = np.bincount(trips[keep], minlength=len(self))
+        return TripTrajectories(
+            trip_ids=self.trip_ids,
+            offsets=np.concatenate([[0], np.cumsum(kept_counts)]).astype(np.int64),
+            lat=self.lat[keep],
+            lng=self.lng[keep],
+            times=self.times[keep]
+        )
+
+    def simplify_mask(self, tolerance: float = 10.0) -> np.ndarray:
+        """
+        Points kept by Douglas-Peucker simplification
+
+        All tracks are simplified together: each pass finds the farthest
+        interior point of every open span at once and splits the spans
+        where it lies beyond the tolerance.
+        """
+        keep = np.zeros(len(self.lat), dtype=bool)
+        counts = self.point_counts()
+        keep[self.offsets[:-1][counts > 0]] = True
+        keep[self.offsets[1:][counts > 0] - 1] = True
+
+        # Local equirectangular projection in meters; fine at trip scale
+        y = np.radians(self.lat) * EARTH_RADIUS_M
+        x_scale = np.cos(np.radians(self.lat)) * EARTH_RADIUS_M
+        lng = np.radians(self.lng)
+
+        starts = self.offsets[:-1][counts > 2]
+        ends = self.offsets[1:][counts > 2] - 1
+        while len(starts):
+            interior = ends - starts - 1
+            span = np.repeat(np.arange(len(starts)), interior)
+            offsets = np.cumsum(interior) - interior
+            points = (np.arange(len(span)) - np.repeat(offsets, interior)
+                      + np.repeat(starts + 1, interior))
+
+            a, b = starts[span], ends[span]
+            scale = (x_scale[a] + x_scale[b]) / 2
+            ax, ay = lng[a] * scale, y[a]
+            dx, dy = lng[b] * scale - ax, y[b] - ay
+            px, py = lng[points] * scale - ax, y[points] - ay
+            length2 = dx * dx + dy * dy
+            with np.errstate(invalid='ignore', divide='ignore'):
+                t = np.where(length2 > 0, np.clip((px * dx + py * dy) / length2, 0, 1), 0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+
+            farthest = np.maximum.reduceat(distances, offsets)
+            # First interior point reaching its span's maximum
+            hits = np.flatnonzero(distances == farthest[span])
+            first = hits[np.unique(span[hits], return_index=True)[1]]
+            split = farthest > tolerance
+            pivots = points[first][split]
+            keep[pivots] = True
+
+            starts, ends = (np.concatenate([starts[split], pivots]),
+                            np.concatenate([pivots, ends[split]]))
+            open_spans = ends - starts > 1
+            starts, ends = starts[open_spans], ends[open_spans]
+
+        return keep
+
+
+def compare_trip_metrics(trips: pd.DataFrame,
+                         metrics: pd.DataFrame,
+                         trip_column: str = 'id',
+                         tolerance: float = 0.25) -> pd.DataFrame:
+    """
+    Check recorded trip distance/duration against values derived from points
+
+    Args:
+        trips: Trips with a trip id column and distance and/or duration
+        metrics: TripTrajectories.trip_metrics() output
+        trip_column: Column of `trips` holding the trip id
+        tolerance: Relative difference above which a value is flagged
+
+    Returns:
+        `trips` with derived_<name>, <name>_error (relative) and
+        <name>_mismatch columns; missing recorded values are filled from
+        the derived ones in <name>_filled
+    """
+    derived = metrics.reindex(trips[trip_column].to_numpy())
+    result = trips.copy()
+    for name in ('distance', 'duration'):
+        values = derived[name].to_numpy()
+        result[f'derived_{name}'] = values
+        if name not in trips.columns:
+            result[f'{name}_filled'] = values
+            continue
+        recorded = pd.to_numeric(trips[name], errors='coerce').to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            error = np.abs(recorded - values) / np.maximum(np.abs(values), 1e-9)
+        result[f'{name}_error'] = error
+        result[f'{name}_mismatch'] = error > tolerance
+        result[f'{name}_filled'] = np.where(np.isnan(recorded), values, recorded)
+    return result
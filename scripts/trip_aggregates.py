@@ -0,0 +1,377 @@
+"""
+Mergeable Trip Aggregates for Traveal
+Per-day partial statistics for incremental travel pattern analysis
+"""
+
+import os
+import json
+import math
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+
+# Resolution used for the value histograms that back median estimates
+HISTOGRAM_DECIMALS = 3
+
+# Histograms with more bins are compacted into this many equal-count bins
+MAX_HISTOGRAM_BINS = 1024
+
+
+@dataclass
+class MomentSummary:
+    """Mergeable count/mean/variance/min/max summary of a numeric column"""
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0  # Sum of squared deviations from the mean
+    min: float = math.inf
+    max: float = -math.inf
+    histogram: Dict[float, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> 'MomentSummary':
+        """Summarize the non-null values of a series"""
+        values = pd.to_numeric(series, errors='coerce').dropna().astype(float)
+        if values.empty:
+            return cls()
+
+        mean = values.mean()
+        histogram = values.round(HISTOGRAM_DECIMALS).value_counts()
+        return cls(
+            count=len(values),
+            mean=float(mean),
+            m2=float(((values - mean) ** 2).sum()),
+            min=float(values.min()),
+            max=float(values.max()),
+            histogram=_compact_histogram({float(k): int(v) for k, v in histogram.items()})
+        )
+
+    def merge(self, other: 'MomentSummary') -> 'MomentSummary':
+        """Combine two summaries (Chan et al. parallel variance)"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        histogram = dict(self.histogram)
+        for value, n in other.histogram.items():
+            histogram[value] = histogram.get(value, 0) + n
+
+        return MomentSummary(
+            count=count,
+            mean=self.mean + delta * other.count / count,
+            m2=self.m2 + other.m2 + delta ** 2 * self.count * other.count / count,
+            min=min(self.min, other.min),
+            max=max(self.max, other.max),
+            histogram=_compact_histogram(histogram)
+        )
+
+    def median(self) -> float:
+        """
+        Median estimated from the value histogram
+
+        Exact to HISTOGRAM_DECIMALS until the histogram is compacted; after
+        that, within the width of the bins around the median.
+        """
+        if self.count == 0:
+            return float('nan')
+
+        values = np.array(sorted(self.histogram), dtype=float)
+        cumulative = np.cumsum([self.histogram[v] for v in values])
+        total = cumulative[-1]
+        lower = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+        upper = values[np.searchsorted(cumulative, total // 2, side='right')]
+        return float((lower + upper) / 2)
+
+    def to_statistics(self) -> Dict[str, float]:
+        """Render in the analyze_trip_patterns statistics format"""
+        nan = float('nan')
+        return {
+            'mean': self.mean if self.count else nan,
+            'median': self.median(),
+            'std': math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else nan,
+            'min': self.min if self.count else nan,
+            'max': self.max if self.count else nan
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dict"""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self.m2,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'histogram': [[value, n] for value, n in self.histogram.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MomentSummary':
+        """Deserialize from to_dict output"""
+        if not data.get('count'):
+            return cls()
+        return cls(
+            count=data['count'],
+            mean=data['mean'],
+            m2=data['m2'],
+            min=data['min'],
+            max=data['max'],
+            histogram={float(value): int(n) for value, n in data['histogram']}
+        )
+
+
+@dataclass
+class TripAggregate:
+    """Mergeable partial aggregates for a set of trips"""
+    trip_count: int = 0
+    hour_counts: Dict[int, int] = field(default_factory=dict)
+    day_counts: Dict[int, int] = field(default_factory=dict)
+    mode_counts: Dict[str, int] = field(default_factory=dict)
+    purpose_counts: Dict[str, int] = field(default_factory=dict)
+    distance: Optional[MomentSummary] = None
+    duration: Optional[MomentSummary] = None
+
+    @classmethod
+    def from_frame(cls,
+                   df: pd.DataFrame,
+                   start_times: Optional[pd.Series] = None) -> 'TripAggregate':
+        """
+        Build aggregates from a trip DataFrame
+
+        Args:
+            df: Trip data in the anonymized schema
+            start_times: Pre-parsed start_hour timestamps, if available
+        """
+        aggregate = cls(trip_count=len(df))
+
+        if 'start_hour' in df.columns:
+            if start_times is None:
+                start_times = pd.to_datetime(df['start_hour'], format='ISO8601')
+            aggregate.hour_counts = _count_values(start_times.dt.hour.dropna().astype(int))
+            aggregate.day_counts = _count_values(start_times.dt.dayofweek.dropna().astype(int))
+
+        if 'mode' in df.columns:
+            aggregate.mode_counts = _count_values(df['mode'])
+
+        if 'purpose' in df.columns:
+            aggregate.purpose_counts = _count_values(df['purpose'])
+
+        if 'distance' in df.columns:
+            aggregate.distance = MomentSummary.from_series(df['distance'])
+
+        if 'duration' in df.columns:
+            aggregate.duration = MomentSummary.from_series(df['duration'])
+
+        return aggregate
+
+    def merge(self, other: 'TripAggregate') -> 'TripAggregate':
+        """Combine two aggregates into a new one"""
+        return TripAggregate(
+            trip_count=self.trip_count + other.trip_count,
+            hour_counts=_merge_counts(self.hour_counts, other.hour_counts),
+            day_counts=_merge_counts(self.day_counts, other.day_counts),
+            mode_counts=_merge_counts(self.mode_counts, other.mode_counts),
+            purpose_counts=_merge_counts(self.purpose_counts, other.purpose_counts),
+            distance=_merge_moments(self.distance, other.distance),
+            duration=_merge_moments(self.duration, other.duration)
+        )
+
+    def to_pattern_analysis(self) -> Dict[str, Any]:
+        """Render in the TravealAnalytics.analyze_trip_patterns format"""
+        analysis = {
+            'temporal_patterns': {},
+            'mode_distribution': {},
+            'purpose_distribution': {},
+            'distance_statistics': {},
+            'duration_statistics': {}
+        }
+
+        if self.hour_counts:
+            analysis['temporal_patterns'] = {
+                'peak_hours': dict(ranked_counts(self.hour_counts)[:5]),
+                'day_distribution': dict(ranked_counts(self.day_counts)),
+                'hourly_average': sum(self.hour_counts.values()) / len(self.hour_counts)
+            }
+
+        analysis['mode_distribution'] = dict(ranked_counts(self.mode_counts))
+        analysis['purpose_distribution'] = dict(ranked_counts(self.purpose_counts))
+
+        if self.distance is not None:
+            analysis['distance_statistics'] = self.distance.to_statistics()
+
+        if self.duration is not None:
+            analysis['duration_statistics'] = self.duration.to_statistics()
+
+        return analysis
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dict"""
+        return {
+            'trip_count': self.trip_count,
+            'hour_counts': {str(k): v for k, v in self.hour_counts.items()},
+            'day_counts': {str(k): v for k, v in self.day_counts.items()},
+            'mode_counts': self.mode_counts,
+            'purpose_counts': self.purpose_counts,
+            'distance': self.distance.to_dict() if self.distance else None,
+            'duration': self.duration.to_dict() if self.duration else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TripAggregate':
+        """Deserialize from to_dict output"""
+        return cls(
+            trip_count=data['trip_count'],
+            hour_counts={int(k): v for k, v in data['hour_counts'].items()},
+            day_counts={int(k): v for k, v in data['day_counts'].items()},
+            mode_counts=data['mode_counts'],
+            purpose_counts=data['purpose_counts'],
+            distance=MomentSummary.from_dict(data['distance']) if data['distance'] else None,
+            duration=MomentSummary.from_dict(data['duration']) if data['duration'] else None
+        )
+
+
+class TripAggregateStore:
+    """Directory of per-day TripAggregate buckets stored as JSON"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, day: date) -> str:
+        return os.path.join(self.directory, f"{day.isoformat()}.json")
+
+    def days(self) -> List[date]:
+        """List the days that have a stored bucket"""
+        days = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                days.append(date.fromisoformat(name[:-5]))
+        return sorted(days)
+
+    def load(self, day: date) -> Optional[TripAggregate]:
+        """Load the bucket for a day, if present"""
+        path = self._path(day)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return TripAggregate.from_dict(json.load(f))
+
+    def save(self, day: date, aggregate: TripAggregate) -> None:
+        """Write (replace) the bucket for a day"""
+        path = self._path(day)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(aggregate.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def update_from_frame(self,
+                          df: pd.DataFrame,
+                          merge_existing: bool = True) -> List[date]:
+        """
+        Bucket trips by start_hour date and store one aggregate per day
+
+        Args:
+            df: Trip data in the anonymized schema
+            merge_existing: Add to stored buckets; False replaces them,
+                for input holding complete days
+
+        Returns:
+            Days that were written
+        """
+        if df.empty or 'start_hour' not in df.columns:
+            return []
+
+        start_times = pd.to_datetime(df['start_hour'], format='ISO8601')
+        days = start_times.dt.date
+
+        written = []
+        for day, index in df.groupby(days).groups.items():
+            aggregate = TripAggregate.from_frame(df.loc[index], start_times.loc[index])
+            if merge_existing:
+                existing = self.load(day)
+                if existing is not None:
+                    aggregate = existing.merge(aggregate)
+            self.save(day, aggregate)
+            written.append(day)
+
+        return written
+
+    def merge_window(self,
+                     end: Union[date, datetime],
+                     days: int = 30) -> TripAggregate:
+        """Merge the stored buckets for the `days` days ending at `end`"""
+        if isinstance(end, datetime):
+            end = end.date()
+
+        merged = TripAggregate()
+        for offset in range(days):
+            aggregate = self.load(end - timedelta(days=offset))
+            if aggregate is not None:
+                merged = merged.merge(aggregate)
+
+        return merged
+
+
+def _count_values(series: pd.Series) -> Dict[Any, int]:
+    """value_counts as a plain dict with native Python keys"""
+    return {
+        (k.item() if hasattr(k, 'item') else k): int(v)
+        for k, v in series.value_counts().items()
+        if v > 0  # Unused categories of categorical columns
+    }
+
+
+def _compact_histogram(histogram: Dict[float, int],
+                       max_bins: int = MAX_HISTOGRAM_BINS) -> Dict[float, int]:
+    """
+    Bound a value histogram by merging neighbouring bins
+
+    Bins are grouped into max_bins runs of roughly equal count, each
+    replaced by its count-weighted mean, so a day's histogram stays the
+    same size however many trips it holds.
+    """
+    if len(histogram) <= max_bins:
+        return histogram
+
+    values = np.array(sorted(histogram), dtype=float)
+    counts = np.array([histogram[v] for v in values], dtype=np.int64)
+    preceding = np.cumsum(counts) - counts
+    groups = preceding * max_bins // counts.sum()
+
+    totals = np.bincount(groups, weights=counts)
+    means = np.bincount(groups, weights=values * counts)
+    present = totals > 0
+    return {
+        float(value): int(total)
+        for value, total in zip(means[present] / totals[present], totals[present])
+    }
+
+
+def _merge_counts(a: Dict[Any, int], b: Dict[Any, int]) -> Dict[Any, int]:
+    merged = dict(a)
+    for key, count in b.items():
+        merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def _merge_moments(a: Optional[MomentSummary],
+                   b: Optional[MomentSummary]) -> Optional[MomentSummary]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a.merge(b)
+
+
+def ranked_counts(counts: Dict[Any, int]) -> List[Tuple[Any, int]]:
+    """
+    (value, count) pairs by descending count, ties by ascending value
+
+    The explicit tie-break keeps reports identical whichever path (frame,
+    stored aggregates or database) produced the counts.
+    """
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,174 @@
+"""
+Trip DataFrame Schema for Traveal
+Declared column dtypes and normalization to compact in-memory columns
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# Target dtypes for normalized trip frames; other columns are left as they are
+TRIP_SCHEMA: Dict[str, str] = {
+    'user_hash': 'category',
+    'mode': 'category',
+    'purpose': 'category',
+    'weather': 'category',
+    'time_of_day': 'category',
+    'anonymization_level': 'category',
+    'anonymized_at': 'category',
+    'start_hour': 'datetime64',
+    'hour': 'int8',
+    'day_of_week': 'int8',
+    'start_lat_zone': 'float64',
+    'start_lng_zone': 'float64',
+    'end_lat_zone': 'float64',
+    'end_lng_zone': 'float64'
+}
+
+# Value types of trip columns that arrive as Python objects, for writers
+# that must fix a column type before every chunk has been seen
+OBJECT_COLUMN_TYPES: Dict[str, str] = {
+    'distance': 'float64',
+    'duration': 'float64',
+    'companions': 'float64',
+    'start_hour': 'string',
+    'start_area': 'zone',
+    'end_area': 'zone'
+}
+
+CATEGORICAL_COLUMNS: List[str] = [
+    name for name, dtype in TRIP_SCHEMA.items() if dtype == 'category'
+]
+
+# Nested {'lat_zone', 'lng_zone'} columns and the prefix of their flat columns
+ZONE_COLUMNS: Dict[str, str] = {
+    'start_area': 'start',
+    'end_area': 'end'
+}
+
+
+def normalize_trip_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast a trip DataFrame to the declared schema
+
+    Low-cardinality strings become categoricals, start_hour becomes
+    datetime64 with int8 hour/day_of_week derived from it (float32 when
+    some start times are missing), and zone dicts are flattened into
+    float64 <prefix>_lat_zone/<prefix>_lng_zone columns. Columns already in
+    their target dtype are left untouched, so normalizing twice is cheap.
+
+    Returns:
+        A new DataFrame; the input is not modified
+    """
+    normalized = df.copy(deep=False)
+
+    for name in CATEGORICAL_COLUMNS:
+        if name in normalized.columns and not isinstance(normalized[name].dtype,
+                                                          pd.CategoricalDtype):
+            normalized[name] = normalized[name].astype('category')
+
+    if 'start_hour' in normalized.columns:
+        if not pd.api.types.is_datetime64_any_dtype(normalized['start_hour']):
+            normalized['start_hour'] = pd.to_datetime(normalized['start_hour'],
+                                                      format='ISO8601')
+        start_times = normalized['start_hour']
+        time_dtype = np.float32 if start_times.isna().any() else np.int8
+        for name, values in (('hour', start_times.dt.hour),
+                             ('day_of_week', start_times.dt.dayofweek)):
+            if normalized.get(name) is None or normalized[name].dtype != time_dtype:
+                normalized[name] = values.astype(time_dtype)
+
+    for source, prefix in ZONE_COLUMNS.items():
+        if source in normalized.columns:
+            lat, lng = zone_coordinates(normalized.pop(source))
+            # Full precision: zones are 0.001° steps that float32 cannot hold
+            # exactly, and they feed distance and clustering work
+            normalized[f'{prefix}_lat_zone'] = lat
+            normalized[f'{prefix}_lng_zone'] = lng
+
+    return normalized
+
+
+def concat_trip_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate normalized chunks without losing categorical dtypes
+
+    pd.concat falls back to object columns when chunks carry different
+    categories, so categories are unioned first.
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    for name in CATEGORICAL_COLUMNS:
+        if all(name in frame.columns and isinstance(frame[name].dtype, pd.CategoricalDtype)
+               for frame in frames):
+            categories = union_categoricals(
+                [frame[name] for frame in frames], ignore_order=True
+            ).categories
+            for frame in frames:
+                frame[name] = frame[name].cat.set_categories(categories)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def trip_zones(df: pd.DataFrame, prefix: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Float64 lat/lng zone arrays for the 'start' or 'end' zone of each trip
+
+    Reads flat normalized columns when present, nested zone dicts
+    otherwise; None when the frame has neither.
+    """
+    lat_name, lng_name = f'{prefix}_lat_zone', f'{prefix}_lng_zone'
+    if lat_name in df.columns and lng_name in df.columns:
+        return (df[lat_name].to_numpy(dtype=float, na_value=np.nan),
+                df[lng_name].to_numpy(dtype=float, na_value=np.nan))
+
+    source = f'{prefix}_area'
+    if source in df.columns:
+        return zone_coordinates(df[source])
+    return None
+
+
+def zone_coordinates(areas: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Split a column of {'lat_zone', 'lng_zone'} dicts into float arrays"""
+    lat = np.full(len(areas), np.nan)
+    lng = np.full(len(areas), np.nan)
+
+    values = areas.to_numpy()
+    present = np.fromiter((isinstance(v, dict) and bool(v) for v in values),
+                          dtype=bool, count=len(values))
+    if present.any():
+        zones = pd.DataFrame.from_records(values[present].tolist())
+        lat[present] = pd.to_numeric(zones.get('lat_zone'), errors='coerce')
+        lng[present] = pd.to_numeric(zones.get('lng_zone'), errors='coerce')
+
+    return lat, lng
+
+
+def arrow_type(name: str, inferred=None):
+    """
+    Declared Arrow type of a trip column
+
+    Known columns get their declared type, so every chunk of a stream
+    casts to the same schema whatever was inferred from the first one.
+    A timestamp inferred for start_hour is kept, since normalized frames
+    hold it as datetimes. Unknown columns keep the `inferred` type unless
+    it is missing or all-null, and are strings then; so are categoricals.
+    """
+    import pyarrow as pa
+
+    declared = OBJECT_COLUMN_TYPES.get(name) or TRIP_SCHEMA.get(name)
+    if declared is None and inferred is not None and not pa.types.is_null(inferred):
+        return inferred
+    if (TRIP_SCHEMA.get(name) == 'datetime64' and inferred is not None
+            and pa.types.is_timestamp(inferred)):
+        return inferred
+    if declared == 'zone':
+        return pa.struct([('lat_zone', pa.float64()), ('lng_zone', pa.float64())])
+    if declared == 'datetime64':
+        return pa.timestamp('ns')
+    if declared in ('float64', 'float32', 'int8'):
+        return pa.from_numpy_dtype(np.dtype(declared))
+    return pa.string()
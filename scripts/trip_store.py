@@ -0,0 +1,213 @@
+"""
+Partitioned Parquet Trip Store for Traveal
+Local anonymized trip cache, Hive-partitioned by start date and mode
+"""
+
+import os
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Set, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('date', pa.string()), ('mode', pa.string())]),
+    flavor='hive'
+)
+
+
+class TripParquetStore:
+    """
+    Anonymized trips stored as Parquet under <root>/date=YYYY-MM-DD/mode=<mode>/
+
+    A manifest records which extraction windows were loaded and when, so
+    callers can tell whether a requested window can be served locally.
+    """
+
+    MANIFEST = '_traveal_store.json'
+
+    def __init__(self, root: str, max_age_hours: float = 24):
+        """
+        Args:
+            root: Directory holding the partitioned dataset
+            max_age_hours: How long a loaded window counts as fresh
+        """
+        self.root = root
+        self.max_age_hours = max_age_hours
+        os.makedirs(root, exist_ok=True)
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, self.MANIFEST)
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if not os.path.exists(self._manifest_path()):
+            return {'windows': []}
+        with open(self._manifest_path()) as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp_path = f"{self._manifest_path()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def append(self,
+               df: pd.DataFrame,
+               date_range: Optional[Tuple[datetime, datetime]] = None) -> int:
+        """
+        Write anonymized trips for an extraction window
+
+        Stored rows in the date/mode partitions the trips touch are kept,
+        except those inside the window, which the new trips replace.
+        Manifest windows overlapping a rewritten date are dropped, since
+        the window is matched on start_hour while extraction filters on
+        creation time, so some of their rows may be gone.
+
+        Args:
+            df: Anonymized trips with a start_hour column
+            date_range: Extraction window these trips cover (None = all
+                trips), recorded in the manifest for freshness checks
+
+        Returns:
+            Number of rows written
+        """
+        manifest = self._load_manifest()
+
+        if not df.empty:
+            if 'start_hour' not in df.columns:
+                raise ValueError("Trip store requires a start_hour column")
+
+            partitioned = df.copy(deep=False)
+            # start_hour is an ISO string, so its first ten characters are the date
+            partitioned['date'] = df['start_hour'].str[:10].fillna('unknown')
+            if 'mode' in df.columns:
+                partitioned['mode'] = df['mode'].astype(object).where(df['mode'].notna(), 'unknown')
+            else:
+                partitioned['mode'] = 'unknown'
+            table = pa.Table.from_pandas(partitioned, preserve_index=False)
+
+            touched = set(zip(partitioned['date'], partitioned['mode']))
+            stale_files, kept = self._partition_rows(touched, date_range)
+            if kept is not None and kept.num_rows:
+                table = pa.concat_tables([table, kept], promote_options='permissive')
+
+            # Unique basenames never collide with the files replaced below
+            ds.write_dataset(
+                table,
+                self.root,
+                format='parquet',
+                partitioning=PARTITIONING,
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                existing_data_behavior='overwrite_or_ignore'
+            )
+            for path in stale_files:
+                os.remove(path)
+
+            dates = {day for day, _ in touched}
+            manifest['windows'] = [
+                window for window in manifest['windows']
+                if not _overlaps(window, dates)
+            ]
+
+        manifest['windows'].append({
+            'start': date_range[0].isoformat() if date_range else None,
+            'end': date_range[1].isoformat() if date_range else None,
+            'refreshed_at': datetime.utcnow().isoformat()
+        })
+        self._save_manifest(manifest)
+        return len(df)
+
+    def _partition_rows(self,
+                        partitions: Set[Tuple[str, str]],
+                        date_range: Optional[Tuple[datetime, datetime]]
+                        ) -> Tuple[List[str], Optional[pa.Table]]:
+        """
+        Files of existing partitions and their rows outside the window
+
+        Returns:
+            (paths to remove once the partitions are rewritten, rows to
+            carry over, with date and mode columns)
+        """
+        paths = []
+        for day, mode in partitions:
+            directory = os.path.join(self.root, f"date={day}", f"mode={mode}")
+            if os.path.isdir(directory):
+                paths += [os.path.join(directory, name) for name in os.listdir(directory)
+                          if name.endswith('.parquet')]
+        if not paths or date_range is None:
+            return paths, None
+
+        start, end = _window_bounds(date_range)
+        dataset = ds.dataset(paths, format='parquet', partitioning=PARTITIONING,
+                             partition_base_dir=self.root)
+        # Trips without a start time cannot be matched to a window, so the
+        # new extraction's copies replace them
+        outside = (ds.field('start_hour') < start) | (ds.field('start_hour') > end)
+        return paths, dataset.to_table(filter=outside)
+
+    def is_fresh(self, date_range: Optional[Tuple[datetime, datetime]] = None) -> bool:
+        """Whether a recently loaded window covers the requested range"""
+        cutoff = datetime.utcnow() - timedelta(hours=self.max_age_hours)
+        for window in self._load_manifest()['windows']:
+            if datetime.fromisoformat(window['refreshed_at']) < cutoff:
+                continue
+            if window['start'] is None:
+                return True
+            if date_range is None:
+                continue
+            if (datetime.fromisoformat(window['start']) <= date_range[0]
+                    and date_range[1] <= datetime.fromisoformat(window['end'])):
+                return True
+        return False
+
+    def read(self,
+             date_range: Optional[Tuple[datetime, datetime]] = None,
+             columns: Optional[List[str]] = None,
+             modes: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Read trips with partition pruning and column projection
+
+        Args:
+            date_range: Keep trips whose start_hour falls in the range
+            columns: Columns to load (all if not provided)
+            modes: Restrict to these travel modes
+        """
+        if not any(name.startswith('date=') for name in os.listdir(self.root)):
+            return pd.DataFrame()
+
+        dataset = ds.dataset(self.root, format='parquet', partitioning=PARTITIONING)
+
+        predicate = None
+        if date_range:
+            start, end = _window_bounds(date_range)
+            predicate = (
+                (ds.field('date') >= start[:10])
+                & (ds.field('date') <= end[:10])
+                & (ds.field('start_hour') >= start)
+                & (ds.field('start_hour') <= end)
+            )
+        if modes:
+            mode_filter = ds.field('mode').isin(modes)
+            predicate = mode_filter if predicate is None else predicate & mode_filter
+
+        table = dataset.to_table(columns=columns, filter=predicate)
+        df = table.to_pandas()
+        return df.drop(columns=['date'], errors='ignore') if columns is None else df
+
+
+def _window_bounds(date_range: Tuple[datetime, datetime]) -> Tuple[str, str]:
+    """ISO start_hour bounds of a window"""
+    start, end = date_range
+    # start_hour is rounded down to the hour, so round the bound too
+    start = start.replace(minute=0, second=0, microsecond=0)
+    return start.isoformat(), end.isoformat()
+
+
+def _overlaps(window: Dict[str, Any], dates: Set[str]) -> bool:
+    """Whether a manifest window covers any of the given partition dates"""
+    if window['start'] is None:
+        return True
+    return any(window['start'][:10] <= day <= window['end'][:10] for day in dates)